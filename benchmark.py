@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tkinter
+import types
+
+import main
+
+# 不需要显示器：用替身代替 Tk 控件，只测应用自身的开销
+
+class Stub:
+    # 通用控件替身：任何方法调用都什么也不做
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def __getitem__(self, key):
+        return ()
+
+    def __setitem__(self, key, value):
+        pass
+
+class StubVar:
+    def __init__(self, master=None, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+    def trace_add(self, mode, callback):
+        pass
+
+class StubRoot(Stub):
+    # after 只登记不执行，避免后台保存的定时器打乱计时
+    def after(self, ms, func=None, *args):
+        return "after#0"
+
+    def after_idle(self, func, *args):
+        return "after#0"
+
+class StubTree(Stub):
+    def __init__(self, *args, **kwargs):
+        self.rows = {}
+        self.click_row = ""
+
+    def insert(self, parent, index, iid=None, values=(), tags=()):
+        self.rows[iid] = values
+        return iid
+
+    def item(self, iid, values=None, tags=None):
+        self.rows[iid] = values
+
+    def delete(self, *iids):
+        for iid in iids:
+            del self.rows[iid]
+
+    def identify(self, component, x, y):
+        return "cell"
+
+    def identify_column(self, x):
+        return "#1"
+
+    def identify_row(self, y):
+        return self.click_row
+
+    def selection(self):
+        return (self.click_row,)
+
+def install_tk_stub():
+    tk_stub = types.SimpleNamespace(**{name: getattr(tkinter, name) for name in dir(tkinter) if name.isupper()})
+    tk_stub.StringVar = tk_stub.BooleanVar = StubVar
+    tk_stub.Menu = tk_stub.Text = tk_stub.Toplevel = Stub
+    ttk_stub = types.SimpleNamespace(
+        Frame=Stub, LabelFrame=Stub, Label=Stub, Entry=Stub, Button=Stub, Checkbutton=Stub,
+        Combobox=Stub, Scrollbar=Stub, Progressbar=Stub, Style=Stub, Treeview=StubTree)
+    main.tk = tk_stub
+    main.ttk = ttk_stub
+    main.messagebox = Stub()
+
+def generate_pool(size, color_count, seed=0):
+    rng = random.Random(seed)
+    if color_count == len(main.DEFAULT_COLORS):
+        colors = {name: dict(config) for name, config in main.DEFAULT_COLORS.items()}
+    else:
+        colors = {f"颜色{i}": {"weight": rng.randint(1, 100), "color": f"#{rng.randrange(1 << 24):06X}"}
+                  for i in range(color_count)}
+    names = list(colors)
+    items = [{"id": i + 1, "name": f"奖项{i}", "color": rng.choice(names), "checked": rng.random() < 0.8}
+             for i in range(size)]
+    return {"colors": colors, "items": items}
+
+def measure(func, runs, inner=1):
+    # 返回每次调用的耗时（秒）；inner > 1 时取一轮内的平均值
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(inner):
+            func()
+        times.append((time.perf_counter() - start) / inner)
+    return times
+
+def bench_pool(size, color_count, runs):
+    save_data = generate_pool(size, color_count)
+    with open("data.json", "w", encoding="utf-8") as f:
+        json.dump(save_data, f, ensure_ascii=False)
+
+    app = main.LotteryApp(StubRoot())
+    results = {}
+
+    def refresh_cold():
+        app.rows = {}
+        app.row_order = []
+        app.tree.rows = {}
+        app.refresh_tree()
+
+    results["load_data"] = measure(app.load_data, runs)
+    results["refresh_tree_cold"] = measure(refresh_cold, runs)
+    results["refresh_tree"] = measure(app.refresh_tree, runs)
+
+    def switch_sort():
+        for key in ("颜色", "权重", "概率", "默认"):
+            app.sort_by.set(key)
+            app.refresh_tree()
+
+    results["refresh_tree_sort_switch"] = measure(switch_sort, runs)
+
+    def type_search():
+        # 逐字输入再清空，模拟搜索框的每次刷新
+        for text in ("奖", "奖项", "奖项1", "奖项12", ""):
+            app.search_text.set(text)
+            app.refresh_tree()
+
+    # 名称索引在后台建立，等建好后再测输入搜索
+    while app.store.ready_index() is None:
+        time.sleep(0.05)
+    results["refresh_tree_search"] = measure(type_search, runs)
+
+    app.tree.click_row = app.row_order[0] if app.row_order else ""
+    event = types.SimpleNamespace(x=0, y=0)
+    if app.tree.click_row:
+        results["on_tree_click"] = measure(lambda: app.on_tree_click(event), runs)
+
+    def draw_after_change():
+        app.sampler.invalidate()
+        app.draw_lottery()
+
+    results["draw_lottery"] = measure(app.draw_lottery, runs, inner=1000)
+    results["draw_lottery_after_change"] = measure(draw_after_change, runs)
+
+    pid = next(iter(app.store))
+    results["auto_save"] = measure(lambda: app.auto_save({"op": "check", "id": pid, "checked": True}), runs, inner=100)
+    results["auto_save_full"] = measure(lambda: app.persister.write_atomic(app.snapshot()), runs)
+
+    virtual = app.virtual_mode.get()
+    app.persister.close()
+    app.history.close()
+    return virtual, results
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    old = {(r["benchmark"], r["size"], r["colors"]): r for r in baseline["results"]}
+    regressions = 0
+    for r in results:
+        base = old.get((r["benchmark"], r["size"], r["colors"]))
+        if base is None or base["median_ms"] == 0:
+            continue
+        ratio = r["median_ms"] / base["median_ms"]
+        flag = "  <-- 变慢" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{r['benchmark']:<26}{r['size']:>9}{r['colors']:>4}  "
+              f"{base['median_ms']:10.3f} -> {r['median_ms']:10.3f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="任务决策助手 热点路径基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000, 1000000])
+    parser.add_argument("--colors", type=int, nargs="+", default=[3, 30])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="与之前的结果文件比较")
+    parser.add_argument("--threshold", type=float, default=1.2, help="中位数超过基线多少倍算变慢")
+    args = parser.parse_args()
+
+    install_tk_stub()
+    output = os.path.abspath(args.output)
+    cwd = os.getcwd()
+    results = []
+    for size in args.sizes:
+        for color_count in args.colors:
+            with tempfile.TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                try:
+                    # 大奖池少跑几轮
+                    runs = args.runs if size < 100000 else max(1, args.runs // 2)
+                    virtual, timings = bench_pool(size, color_count, runs)
+                finally:
+                    os.chdir(cwd)
+            for name, times in timings.items():
+                ms = [t * 1000 for t in times]
+                results.append({
+                    "benchmark": name,
+                    "size": size,
+                    "colors": color_count,
+                    "virtual": virtual,
+                    "runs": len(ms),
+                    "mean_ms": statistics.mean(ms),
+                    "median_ms": statistics.median(ms),
+                    "min_ms": min(ms)
+                })
+                print(f"{name:<26}{size:>9}{color_count:>4}  {statistics.median(ms):10.3f} ms")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "version": main.CURRENT_VERSION
+            },
+            "results": results
+        }, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,45 +1,1804 @@
+import time
+STARTUP_START = time.perf_counter()  # --profile-startup 统计导入耗时
+
 import tkinter as tk
-from tkinter import ttk, messagebox, colorchooser,filedialog
-import pygame
+from tkinter import ttk, messagebox, colorchooser,filedialog, simpledialog
+import argparse
+import concurrent.futures
+import contextlib
+import csv
+import hashlib
+import io
 import json
+import math
+import mmap
 import random
-import requests
+import re
+import sqlite3
+import struct
 import os
 import sys
+import threading
+from array import array
+from collections import OrderedDict, deque
 from datetime import datetime
+from urllib.parse import parse_qs, urlparse
 import webbrowser
 
+# pygame、requests、http.server、multiprocessing 和可选的 numpy 导入较慢，在第一次用到时才导入
+IMPORTS_DONE = time.perf_counter()
+
 CURRENT_VERSION = "1.0.0"
 
+VERSION_URL = "https://raw.githubusercontent.com/Voller-u/Spinner/master/version.json"
+UPDATE_TIMEOUT = 10
+# 缓存最近一次获取的 version.json 及其 ETag/Last-Modified
+UPDATE_CACHE_PATH = "update_cache.json"
+# 启动后在后台静默检查更新，只在有新版本时提示
+AUTO_CHECK_UPDATES = False
+
+# 诊断：事件循环延迟的采样间隔
+LAG_INTERVAL_MS = 100
+
+class MetricTimer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, (time.perf_counter() - self.start) * 1000)
+
+class Metrics:
+    # 热点路径的耗时（毫秒）和字节数统计，每项保留最近 window 个样本。
+    # 未启用时 timer() 返回共享的空上下文，record() 立即返回。
+    NULL_TIMER = contextlib.nullcontext()
+
+    def __init__(self, window=1000):
+        self.enabled = False
+        self.window = window
+        self.samples = {}
+
+    def timer(self, name):
+        if not self.enabled:
+            return self.NULL_TIMER
+        return MetricTimer(self, name)
+
+    def record(self, name, value):
+        if not self.enabled:
+            return
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples.setdefault(name, deque(maxlen=self.window))
+        samples.append(value)
+
+    def summary(self):
+        result = {}
+        for name, samples in list(self.samples.items()):
+            values = sorted(samples)
+            if not values:
+                continue
+            pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+            result[name] = {"count": len(values), "p50": pick(0.5), "p90": pick(0.9),
+                            "p99": pick(0.99), "max": values[-1]}
+        return result
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"time": datetime.now().isoformat(), "metrics": self.summary(),
+                       "samples": {name: list(samples) for name, samples in list(self.samples.items())}},
+                      f, ensure_ascii=False, indent=2)
+
+METRICS = Metrics()
+
+def import_numpy():
+    # numpy 是可选依赖，没有安装时返回 None
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
 DEFAULT_COLORS = {
     "蓝色": {"weight": 50, "color": "#3399FF"},
     "紫色": {"weight": 30, "color": "#CC99FF"},
     "金色": {"weight": 20, "color": "#FFD700"}
 }
 
-class LotteryApp:
-    def __init__(self, root):
+ROW_HEIGHT = 25
+# 批量抽奖的保留率低于该值时不用 numpy 去重，改为逐次抽样
+DRAW_MANY_MIN_KEEP_RATE = 0.1
+# 自动保存：修改后延迟写盘的时间，以及日志累积多少条后做一次整体保存
+SAVE_DELAY_MS = 500
+SAVE_JOURNAL = True
+# 存储后端："json" 为默认的 data.json；"sqlite" 使用 data.db，首次启动时从 data.json 迁移
+STORAGE_BACKEND = "json"
+JOURNAL_COMPACT_LIMIT = 1000
+# 奖项数量超过该值时加载后自动切换为虚拟列表
+VIRTUAL_LIST_THRESHOLD = 5000
+# 批量导入/导出每次占用界面线程的时间上限
+BULK_SLICE_MS = 30
+# 笔记目录和全文索引文件
+NOTES_DIR = "notes"
+NOTES_INDEX_PATH = "notes_index.db"
+# 笔记编辑器每次插入的字符数，以及停止输入多久后自动保存
+NOTE_LOAD_CHUNK = 64 * 1024
+NOTE_SAVE_DELAY_MS = 1000
+# 播放列表：缓存最近播放的曲目数和总字节数上限，以及检查切歌的间隔
+MUSIC_EXTENSIONS = (".mp3", ".wav", ".ogg", ".flac")
+MUSIC_CACHE_TRACKS = 5
+MUSIC_CACHE_BYTES = 256 * 1024 * 1024
+MUSIC_POLL_MS = 200
+# 多奖池：默认奖池沿用 data.json，其余奖池各自一个文件放在 pools 目录；最多同时保留几个已加载的奖池
+DEFAULT_POOL = "默认"
+POOLS_DIR = "pools"
+POOL_CACHE_SIZE = 4
+# 转盘：画布大小、超过多少个扇区改为按颜色汇总、帧率、转动时长和圈数、显示文字的最小扇区角度
+WHEEL_SIZE = 400
+WHEEL_MAX_SECTORS = 72
+WHEEL_FPS = 60
+WHEEL_SPIN_MS = 3000
+WHEEL_TURNS = 4
+WHEEL_LABEL_MIN_EXTENT = 10
+# 名称搜索框停止输入多久后刷新列表
+SEARCH_DELAY_MS = 250
+
+class AliasTable:
+    # Vose 别名表：建表 O(n)，每次采样 O(1)
+    __slots__ = ("prob", "alias", "total")
+
+    def __init__(self, weights):
+        n = len(weights)
+        self.total = float(sum(weights))
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        if n == 0 or self.total <= 0:
+            return
+
+        scaled = [w * n / self.total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # 剩余的列由于浮点误差可能略偏离 1，直接视为满列
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self, rng=random):
+        i = int(rng.random() * len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+class PrizeStore:
+    # 列式奖池：每个奖项有稳定的 id，名称/颜色/勾选状态按列存放，
+    # 同时维护 id→行号、(颜色, 勾选)→成员 两个索引。删除只留空洞，空洞过多时再压缩。
+    # next_id 随奖池一起保存，删掉的 id 不会再分配给新奖项
+    def __init__(self):
+        self.ids = array("q")  # 行号 → id，0 表示已删除
+        self.names = []
+        self.colors = []
+        self.checked = bytearray()
+        self.rows = {}  # id → 行号
+        self.members = {}  # (颜色, 是否勾选) → 按行号排列的 id 列表，排序时使用
+        self.name_index = None  # 名称中的单字和相邻两字 → 按添加顺序的 id 数组，加载后在后台建立
+        self.index_built = None  # 后台线程建好、尚未接手的 (批次, 索引)
+        self.index_generation = 0  # 每次开始建索引加一，丢弃被重建取代的结果
+        self.index_pending = None  # 建索引期间新增的 [(id, 名称)]
+        self.index_stale = 0  # 删除后留在索引里的 id 数，搜索时跳过，过多时重建
+        self.next_id = 1
+        self.version = 0  # 每次修改加一
+
+    @classmethod
+    def from_items(cls, items):
+        store = cls()
+        for item in items:
+            store.add(item["name"], item["color"], item.get("checked", True), item.get("id"))
+        return store
+
+    def columns(self):
+        # 各列的副本，整体保存时交给后台线程，由它组装奖项和编码
+        return self.ids[:], self.names[:], self.colors[:], bytes(self.checked)
+
+    def apply(self, change):
+        # 重放一条修改日志
+        op = change["op"]
+        pid = change["id"]
+        if op == "add":
+            if pid not in self.rows:
+                self.add(change["name"], change["color"], change["checked"], pid)
+        elif pid in self.rows:
+            if op == "remove":
+                self.remove(pid)
+            elif op == "check":
+                if self.is_checked(pid) != bool(change["checked"]):
+                    self.toggle(pid)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return filter(None, self.ids)
+
+    def __contains__(self, pid):
+        return pid in self.rows
+
+    def add(self, name, color, checked=True, pid=None):
+        if pid is None:
+            pid = self.next_id
+        elif pid < self.next_id and (self.name_index is not None or self.index_pending is not None):
+            # 重放日志时可能重新加入删掉的 id，索引里还留着它的旧名称
+            self.rebuild_name_index()
+        self.next_id = max(self.next_id, pid + 1)
+        color = sys.intern(color)
+        self.rows[pid] = len(self.ids)
+        self.ids.append(pid)
+        self.names.append(name)
+        self.colors.append(color)
+        self.checked.append(1 if checked else 0)
+        self.insert_member(pid)
+        if self.ready_index() is not None:
+            self.index_name(pid, name)
+        elif self.index_pending is not None:
+            self.index_pending.append((pid, name))
+        self.version += 1
+        return pid
+
+    def remove(self, pid):
+        self.remove_member(pid)
+        if self.name_index is not None or self.index_pending is not None:
+            self.index_stale += 1
+            if self.index_stale > len(self.rows) + 1024:
+                self.rebuild_name_index()
+        row = self.rows.pop(pid)
+        self.version += 1
+        self.ids[row] = 0
+        self.names[row] = None
+        if len(self.ids) > 2 * len(self.rows) + 64:
+            self.compact()
+
+    def compact(self):
+        live = [row for row, pid in enumerate(self.ids) if pid]
+        self.ids = array("q", (self.ids[row] for row in live))
+        self.names = [self.names[row] for row in live]
+        self.colors = [self.colors[row] for row in live]
+        self.checked = bytearray(self.checked[row] for row in live)
+        self.rows = {pid: row for row, pid in enumerate(self.ids)}
+
+    def name(self, pid):
+        return self.names[self.rows[pid]]
+
+    def color(self, pid):
+        return self.colors[self.rows[pid]]
+
+    def is_checked(self, pid):
+        return bool(self.checked[self.rows[pid]])
+
+    def toggle(self, pid):
+        row = self.rows[pid]
+        self.remove_member(pid)
+        self.checked[row] ^= 1
+        self.insert_member(pid)
+        self.version += 1
+        return bool(self.checked[row])
+
+    def recolor(self, pid, color):
+        row = self.rows[pid]
+        self.remove_member(pid)
+        self.colors[row] = sys.intern(color)
+        self.insert_member(pid)
+        self.version += 1
+
+    def member_position(self, members, row):
+        # 二分查找：members 按行号递增，压缩只会整体平移行号，不影响顺序
+        lo, hi = 0, len(members)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.rows[members[mid]] < row:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def insert_member(self, pid):
+        row = self.rows[pid]
+        members = self.members.setdefault((self.colors[row], bool(self.checked[row])), [])
+        if not members or self.rows[members[-1]] < row:
+            members.append(pid)  # 新奖项总在最后一行
+        else:
+            members.insert(self.member_position(members, row), pid)
+
+    def remove_member(self, pid):
+        row = self.rows[pid]
+        members = self.members[(self.colors[row], bool(self.checked[row]))]
+        del members[self.member_position(members, row)]
+
+    def build_name_index(self):
+        # 在后台线程建立名称索引，不占用界面线程；建好之前搜索逐个扫描
+        if self.name_index is not None or self.index_pending is not None:
+            return
+        self.index_pending = []
+        self.index_stale = 0
+        self.index_generation += 1
+        threading.Thread(target=self.index_worker, args=(self.index_generation, self.ids[:], self.names[:]),
+                         daemon=True).start()
+
+    def drop_name_index(self):
+        # 丢掉索引；还在后台建的旧索引看到代数变了会提前退出
+        self.index_generation += 1
+        self.name_index = self.index_built = self.index_pending = None
+
+    def rebuild_name_index(self):
+        self.drop_name_index()
+        self.build_name_index()
+
+    def index_worker(self, generation, ids, names):
+        # 后台线程：只读取建索引时复制的 id 和名称，建好后交给界面线程在 ready_index 里接手
+        index = {}
+        get = index.get
+        for i, (pid, name) in enumerate(zip(ids, names)):
+            if not i & 4095 and generation != self.index_generation:
+                return
+            if pid:
+                for gram in name_grams(name):
+                    postings = get(gram)
+                    if postings is None:
+                        postings = index[gram] = array("q")
+                    postings.append(pid)
+        self.index_built = (generation, index)
+
+    def ready_index(self):
+        # 接手后台建好的索引，补上建索引期间新增的奖项
+        built = self.index_built
+        if self.name_index is None and built is not None and built[0] == self.index_generation:
+            self.index_built = None
+            self.name_index = built[1]
+            pending, self.index_pending = self.index_pending, None
+            for pid, name in pending:
+                self.index_name(pid, name)
+        return self.name_index
+
+    def index_name(self, pid, name):
+        for gram in name_grams(name):
+            postings = self.name_index.get(gram)
+            if postings is None:
+                postings = self.name_index[gram] = array("q")
+            postings.append(pid)
+
+    def search(self, query):
+        # 名称包含 query（不区分大小写）的奖项 id，按添加顺序。一两个字的查询本身就是索引里的片段，
+        # 结果精确；更长的查询取最短的片段列表，再核对原文。删除的奖项留在索引里，这里跳过
+        query = query.lower()
+        index = self.ready_index()
+        if index is None:
+            return [pid for pid, name in zip(self.ids, self.names) if pid and query in name.lower()]
+        postings = min((index.get(gram, ()) for gram in name_grams(query)), key=len)
+        rows = self.rows
+        if len(query) <= 2:
+            return list(postings) if not self.index_stale else [pid for pid in postings if pid in rows]
+        names = self.names
+        return [pid for pid in postings if pid in rows and query in names[rows[pid]].lower()]
+
+    def segment_ranks(self, keyed, reverse=False):
+        # 各分类所在段的名次，键相同的分类同一名次
+        keys = sorted({key for key, member_key in keyed}, reverse=reverse)
+        rank = {key: i for i, key in enumerate(keys)}
+        return {member_key: rank[key] for key, member_key in keyed}
+
+    def sorted_members(self, keyed, reverse=False):
+        # keyed 为 [(排序键, (颜色, 是否勾选))]，按键排列各分类；键相同的分类按行号合并，
+        # 降序时只颠倒段的顺序，与列表稳定排序的结果一致
+        segments = {}
+        for key, member_key in keyed:
+            members = self.members.get(member_key)
+            if members:
+                segments.setdefault(key, []).append(members)
+        result = []
+        for key in sorted(segments, reverse=reverse):
+            runs = segments[key]
+            if len(runs) == 1:
+                result.extend(runs[0])
+            else:
+                # 各段本身已有序，Timsort 只做归并
+                result.extend(sorted((pid for run in runs for pid in run), key=self.rows.__getitem__))
+        return result
+
+    def color_count(self, color):
+        return len(self.members.get((color, True), ())) + len(self.members.get((color, False), ()))
+
+def name_grams(name):
+    # 名称索引的片段：每个字和每两个相邻的字
+    name = name.lower()
+    return set(name).union(name[i:i + 2] for i in range(len(name) - 1))
+
+def read_journal(journal_path, repair=False):
+    # 读取 JSON Lines 日志。写入中途崩溃时最后一行可能不完整（没有换行或无法解析），读到这里为止；
+    # repair 时把文件截回最后一条完整记录，否则之后追加的记录会接在半行后面，下次读取时一起丢失
+    changes = []
+    good = 0
+    try:
+        with open(journal_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    changes.append(json.loads(line))
+                except ValueError:
+                    break
+                good += len(line)
+            size = f.seek(0, os.SEEK_END)
+    except FileNotFoundError:
+        return changes
+    if repair and good < size:
+        with open(journal_path, "r+b") as f:
+            f.truncate(good)
+    return changes
+
+def column_rows(columns):
+    # 跳过已删除的行，返回 [(id, 名称, 颜色, 勾选)]
+    return [row for row in zip(*columns) if row[0]]
+
+def read_json_pool(path, repair=False):
+    # 读取 data.json 并重放修改日志，返回 (颜色设置, 奖池, 日志条数)；文件不存在时颜色设置为 None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            save_data = json.load(f)
+    except FileNotFoundError:
+        save_data = {}
+    # 旧版本写入文件的 probability 字段在这里被忽略，概率只在显示时计算
+    store = PrizeStore.from_items(save_data.get("items", []))
+    store.next_id = max(store.next_id, save_data.get("next_id", 1))
+    changes = read_journal(path + ".journal", repair)
+    for change in changes:
+        store.apply(change)
+    return save_data.get("colors"), store, len(changes)
+
+class DataPersister:
+    # 后台写盘：一段时间内的多次修改合并为一次写入。整体保存先写临时文件再原子替换，
+    # 单条修改只追加到日志文件，下一次整体保存时日志被清空。
+    journal = SAVE_JOURNAL
+    lazy = False  # 为 True 时奖项可以分片读入（PoolLoader），也可以直接分页查询
+
+    def __init__(self, path="data.json", delay=0.2, on_error=None):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.delay = delay
+        self.on_error = on_error
+        self.jobs = []
+        self.journal_size = 0  # 上次整体保存后累计的日志条数
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def load(self):
+        colors, store, self.journal_size = read_json_pool(self.path, repair=True)
+        return colors, store
+
+    def write(self, snapshot):
+        with self.cond:
+            self.jobs.append(("snapshot", snapshot))
+            self.journal_size = 0
+            self.cond.notify()
+
+    def append(self, change):
+        # 返回 True 表示日志已经过长，应该安排一次整体保存
+        with self.cond:
+            self.jobs.append(("change", change))
+            self.journal_size += 1
+            self.cond.notify()
+            return self.journal_size >= JOURNAL_COMPACT_LIMIT
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.jobs and not self.closed:
+                    self.cond.wait()
+                if not self.jobs:
+                    return
+                closed = self.closed
+            if not closed:
+                time.sleep(self.delay)
+            with self.cond:
+                jobs, self.jobs = self.jobs, []
+            try:
+                with METRICS.timer("save.write"):
+                    self.process(jobs)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+
+    def process(self, jobs):
+        # 只写最后一份快照，它已经包含了之前的所有修改
+        snapshots = [i for i, (kind, _) in enumerate(jobs) if kind == "snapshot"]
+        if snapshots:
+            self.write_atomic(jobs[snapshots[-1]][1])
+            jobs = jobs[snapshots[-1] + 1:]
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+        if jobs:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                for _, change in jobs:
+                    f.write(json.dumps(change, ensure_ascii=False) + "\n")
+                METRICS.record("save.journal_bytes", f.tell())
+
+    def write_atomic(self, snapshot):
+        # 在后台线程里组装奖项；json.dumps 走 C 编码器，比 json.dump 写文件对象快得多
+        save_data = {"colors": snapshot["colors"],
+                     "items": [{"id": pid, "name": name, "color": color, "checked": bool(checked)}
+                               for pid, name, color, checked in column_rows(snapshot["columns"])],
+                     "next_id": snapshot["next_id"]}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(save_data, ensure_ascii=False))
+            METRICS.record("save.full_bytes", f.tell())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+class SqlitePersister(DataPersister):
+    # SQLite 存储：每条修改直接写入对应的行，不需要日志压缩。
+    # 索引支持按颜色筛选，以及按 颜色/权重/概率 排序的分页查询。
+    journal = True
+    lazy = True
+
+    def __init__(self, path="data.db", json_path="data.json", delay=0.2, on_error=None):
+        self.json_path = json_path
+        self.conn = None  # 后台线程使用的连接
+        self.reader_conn = None  # 界面线程使用的连接
+        super().__init__(path, delay, on_error)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS colors (
+                name TEXT PRIMARY KEY, weight INTEGER NOT NULL, color TEXT NOT NULL, position INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS prizes (
+                id INTEGER PRIMARY KEY, name TEXT NOT NULL, color TEXT NOT NULL, checked INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS prizes_color ON prizes (color, id);
+            CREATE INDEX IF NOT EXISTS prizes_checked_color ON prizes (checked, color, id);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        return conn
+
+    def reader(self):
+        if self.reader_conn is None:
+            migrate = not os.path.exists(self.path) and os.path.exists(self.json_path)
+            self.reader_conn = self.connect()
+            if migrate:
+                # 一次性迁移 data.json（包括尚未压缩的日志）
+                colors, store, _ = read_json_pool(self.json_path)
+                with self.reader_conn:
+                    self.write_snapshot(self.reader_conn, {"colors": colors, "columns": store.columns(),
+                                                           "next_id": store.next_id})
+        return self.reader_conn
+
+    def load(self, prizes=True):
+        # prizes 为 False 时只读颜色设置，返回的空奖池由 PoolLoader 分片填入；
+        # next_id 先设好，读入期间新增的奖项不会与尚未读到的 id 冲突
+        conn = self.reader()
+        colors = {name: {"weight": weight, "color": color} for name, weight, color in
+                  conn.execute("SELECT name, weight, color FROM colors ORDER BY position")}
+        store = PrizeStore()
+        if prizes:
+            for pid, name, color, checked in self.read_prizes(conn):
+                store.add(name, color, bool(checked), pid)
+        stored_next, max_id = conn.execute(
+            "SELECT (SELECT value FROM meta WHERE key = 'next_id'), (SELECT MAX(id) FROM prizes)").fetchone()
+        store.next_id = max(store.next_id, stored_next or 1, (max_id or 0) + 1)
+        return colors or None, store
+
+    def read_prizes(self, conn):
+        return conn.execute("SELECT id, name, color, checked FROM prizes ORDER BY id")
+
+    def checked_counts(self):
+        conn = self.reader()
+        return conn.execute("SELECT color, COUNT(*) FROM prizes WHERE checked = 1 GROUP BY color").fetchall()
+
+    def close(self):
+        super().close()
+        if self.reader_conn is not None:
+            self.reader_conn.close()
+            self.reader_conn = None
+
+    def run(self):
+        # 写入连接在后台线程里创建，也要在这里关闭；最后一个连接关闭时 SQLite 会清理 WAL 文件
+        try:
+            super().run()
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def append(self, change):
+        super().append(change)
+        return False
+
+    def process(self, jobs):
+        if self.conn is None:
+            self.conn = self.connect()
+        snapshots = [i for i, (kind, _) in enumerate(jobs) if kind == "snapshot"]
+        with self.conn:
+            if snapshots:
+                self.write_snapshot(self.conn, jobs[snapshots[-1]][1])
+                jobs = jobs[snapshots[-1] + 1:]
+            for _, change in jobs:
+                self.write_change(self.conn, change)
+
+    def write_snapshot(self, conn, snapshot):
+        conn.execute("DELETE FROM colors")
+        if snapshot["colors"] is not None:
+            conn.executemany("INSERT INTO colors VALUES (?, ?, ?, ?)",
+                             [(name, config["weight"], config["color"], position)
+                              for position, (name, config) in enumerate(snapshot["colors"].items())])
+        conn.execute("DELETE FROM prizes")
+        conn.executemany("INSERT INTO prizes VALUES (?, ?, ?, ?)", column_rows(snapshot["columns"]))
+        self.write_next_id(conn, snapshot.get("next_id", 1))
+
+    def write_next_id(self, conn, next_id):
+        conn.execute("INSERT INTO meta VALUES ('next_id', ?) "
+                     "ON CONFLICT (key) DO UPDATE SET value = max(value, excluded.value)", (next_id,))
+
+    def write_change(self, conn, change):
+        if change["op"] == "add":
+            conn.execute("INSERT OR IGNORE INTO prizes VALUES (?, ?, ?, ?)",
+                         (change["id"], change["name"], change["color"], int(change["checked"])))
+            self.write_next_id(conn, change["id"] + 1)
+        elif change["op"] == "remove":
+            conn.execute("DELETE FROM prizes WHERE id = ?", (change["id"],))
+        elif change["op"] == "check":
+            conn.execute("UPDATE prizes SET checked = ? WHERE id = ?", (int(change["checked"]), change["id"]))
+
+    def query_page(self, keyed, reverse=False, offset=0, limit=None, query=""):
+        # 分页查询，顺序与 LotteryEngine.filter_sorted 相同：keyed 为 sort_keys 的结果，
+        # 键相同的 (颜色, 勾选) 归为一段，段内按 id（即读入后的行号）排列。返回 [(id, 名称, 颜色, 是否勾选)]
+        conn = self.reader()
+        segments = {}
+        for key, member_key in keyed:
+            segments.setdefault(key, []).append(member_key)
+
+        search = ""
+        if query:
+            # SQLite 的 lower 只处理 ASCII，中文名称不受影响
+            search = " AND instr(lower(name), ?) > 0"
+        total = 0
+        rows = []
+        for key in sorted(segments, reverse=reverse):
+            members = segments[key]
+            where = "(" + " OR ".join("(color = ? AND checked = ?)" for member in members) + ")" + search
+            params = [value for color, checked in members for value in (color, int(checked))]
+            if query:
+                params.append(query.lower())
+            count = conn.execute(f"SELECT COUNT(*) FROM prizes WHERE {where}", params).fetchone()[0]
+            if offset < total + count and (limit is None or len(rows) < limit):
+                start = max(0, offset - total)
+                rows += conn.execute(
+                    f"SELECT id, name, color, checked FROM prizes WHERE {where} ORDER BY id LIMIT ? OFFSET ?",
+                    params + [-1 if limit is None else limit - len(rows), start]).fetchall()
+            total += count
+        return [(pid, name, color, bool(checked)) for pid, name, color, checked in rows]
+
+class PrizeSampler:
+    # 两级抽样：先按 颜色权重×勾选数量 用别名表选颜色，再在该颜色内均匀选奖项。
+    # 奖池或颜色权重变化时只标记失效，下次抽奖时才重建。
+    def __init__(self, source):
+        self.source = source  # 返回 (store, color_settings) 的函数
+        self.dirty = True
+        self.version = 0
+        self.last = None
+        self.groups = []
+        self.group_weights = []
+        self.table = None
+        self.excluded_tables = {}
+        self.last_position = None  # 上一次结果在 groups 中的 (组号, 位置)
+
+    def invalidate(self):
+        self.dirty = True
+        self.version += 1  # 奖池版本，写入抽奖记录
+
+    def rebuild(self):
+        # 各组直接引用奖池里按行号排列的已勾选成员列表，不复制奖项，重建只与颜色数有关
+        store, color_settings = self.source()
+        self.groups = []
+        self.group_weights = []
+        for color, config in color_settings.items():
+            group = store.members.get((color, True))
+            if group and config["weight"] > 0:
+                self.groups.append(group)
+                self.group_weights.append(config["weight"])
+
+        self.table = AliasTable([w * len(g) for w, g in zip(self.group_weights, self.groups)])
+        self.excluded_tables = {}
+        self.last_position = self.locate(store, color_settings, self.last)
+        self.dirty = False
+
+    def locate(self, store, color_settings, pid):
+        # 奖项在 groups 中的位置，不参与抽奖时返回 None
+        if pid not in store or not store.is_checked(pid) or color_settings[store.color(pid)]["weight"] <= 0:
+            return None
+        group = store.members[(store.color(pid), True)]
+        for g, members in enumerate(self.groups):
+            if members is group:
+                return g, store.member_position(group, store.rows[pid])
+        return None
+
+    def excluded_table(self, g):
+        # 排除上一次结果后的颜色表：只有该颜色的数量减一，按颜色缓存
+        table = self.excluded_tables.get(g)
+        if table is None:
+            weights = [w * (len(group) - (i == g))
+                       for i, (w, group) in enumerate(zip(self.group_weights, self.groups))]
+            table = self.excluded_tables[g] = AliasTable(weights)
+        return table
+
+    def draw(self, rng=random):
+        if self.dirty:
+            self.rebuild()
+        if not self.groups:
+            return None
+
+        last = self.last_position
+        if last is None:
+            g = self.table.sample(rng)
+            group = self.groups[g]
+            pos = int(rng.random() * len(group))
+        else:
+            last_g, last_pos = last
+            table = self.excluded_table(last_g)
+            if table.total <= 0:
+                # 除了上一次结果已没有其他可抽选的奖项
+                g, pos = last
+            else:
+                g = table.sample(rng)
+                group = self.groups[g]
+                if g == last_g:
+                    # 在其余 n-1 个奖项中均匀选择，跳过上一次结果
+                    pos = int(rng.random() * (len(group) - 1))
+                    if pos >= last_pos:
+                        pos += 1
+                else:
+                    pos = int(rng.random() * len(group))
+
+        selected = self.groups[g][pos]
+        self.last = selected
+        self.last_position = (g, pos)
+        return selected
+
+    def draw_many(self, n, seed=None):
+        # 批量抽奖，返回奖项 id 列表，不依赖界面；保持"与上一次结果不同"的顺序约束
+        if self.dirty:
+            self.rebuild()
+        if not self.groups or n <= 0:
+            return []
+        if import_numpy() is None or self.keep_rate() < DRAW_MANY_MIN_KEEP_RATE:
+            rng = random.Random(seed)
+            return [self.draw(rng) for _ in range(n)]
+        return self.draw_many_numpy(n, seed)
+
+    def keep_rate(self):
+        # 独立抽样时与上一次结果不同的概率 1 - Σp²；某个奖项占绝对多数时接近 0
+        total = self.table.total
+        return 1.0 - sum(len(group) * (w / total) ** 2 for w, group in zip(self.group_weights, self.groups))
+
+    def draw_many_numpy(self, n, seed):
+        # 独立同分布抽样后去掉相邻重复，结果与逐次拒绝重抽的过程同分布。
+        # 平均每 1/keep_rate 次抽样留下一个，keep_rate 太小时由 draw_many 改用逐次精确抽样
+        import numpy as np
+        flat = np.array([pid for group in self.groups for pid in group], dtype=np.int64)
+        if len(flat) == 1:
+            self.last = int(flat[0])
+            self.last_position = (0, 0)
+            return [self.last] * n
+
+        rng = np.random.default_rng(seed)
+        counts = np.array([len(group) for group in self.groups], dtype=np.int64)
+        offsets = np.cumsum(counts) - counts
+        prob = np.array(self.table.prob)
+        alias = np.array(self.table.alias, dtype=np.int64)
+        keep_rate = self.keep_rate()
+
+        last = self.last_position
+        prev = int(offsets[last[0]]) + last[1] if last is not None else -1
+        out = np.empty(n, dtype=np.int64)
+        filled = 0
+        while filled < n:
+            m = min(int((n - filled) / keep_rate) + 64, 1 << 22)
+            cols = rng.integers(0, len(self.groups), m)
+            g = np.where(rng.random(m) < prob[cols], cols, alias[cols])
+            idx = offsets[g] + (rng.random(m) * counts[g]).astype(np.int64)
+            keep = np.empty(m, dtype=bool)
+            keep[0] = idx[0] != prev
+            keep[1:] = idx[1:] != idx[:-1]
+            idx = idx[keep][:n - filled]
+            out[filled:filled + len(idx)] = idx
+            filled += len(idx)
+            if len(idx):
+                prev = int(idx[-1])
+
+        self.last = int(flat[prev])
+        g = int(np.searchsorted(offsets, prev, side="right")) - 1
+        self.last_position = (g, prev - int(offsets[g]))
+        return flat[out].tolist()
+
+def chi_square_sf(x, dof):
+    # 卡方分布的上尾概率 Q(dof/2, x/2)，用级数/连分式计算正则化不完全伽马函数
+    if dof <= 0:
+        return float("nan")
+    a, x = dof / 2.0, x / 2.0
+    if x <= 0:
+        return 1.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1.0 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+    b = x + 1 - a
+    c = 1.0 / 1e-300
+    d = 1.0 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = 1.0 / (d if abs(d) > 1e-300 else 1e-300)
+        c = b + an / c
+        c = c if abs(c) > 1e-300 else 1e-300
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return min(1.0, h * math.exp(log_prefix))
+
+def stationary_probabilities(weights, counts):
+    # "与上一次不同"的抽奖过程是可逆马尔可夫链：P(i→j) = p_j / (1 - p_i)（j ≠ i），
+    # 由细致平衡 π_i·P(i→j) = π_j·P(j→i) 得 π_i ∝ p_i·(1 - p_i)。
+    # 同颜色奖项的 p 相同，只按颜色计算，与奖池大小无关。返回每种颜色中单个奖项的长期概率
+    total = sum(w * n for w, n in zip(weights, counts))
+    if total <= 0:
+        return [0.0] * len(weights)
+    nominal = [w / total if n else 0.0 for w, n in zip(weights, counts)]
+    scores = [p * (1 - p) for p in nominal]
+    norm = sum(s * n for s, n in zip(scores, counts))
+    if norm <= 0:
+        # 只有一个可抽选的奖项，每次都是它
+        return nominal
+    return [s / norm for s in scores]
+
+def monte_carlo_worker(groups, draws, seed):
+    # 子进程：按 {颜色: (权重, 数量)} 构造奖池，用真实的抽样器连续抽 draws 次，返回各颜色的抽中次数
+    store = PrizeStore()
+    colors = {}
+    for color, (weight, count) in groups.items():
+        colors[color] = {"weight": weight, "color": ""}
+        for i in range(count):
+            store.add(f"{color}{i}", color)
+    sampler = PrizeSampler(lambda: (store, colors))
+    pids = sampler.draw_many(draws, seed=seed)
+
+    np = import_numpy()
+    if np is None:
+        counts = dict.fromkeys(groups, 0)
+        for pid in pids:
+            counts[store.color(pid)] += 1
+        return counts
+    # id 按颜色顺序连续分配，用区间边界换算成颜色下标
+    bounds = np.cumsum([count for weight, count in groups.values()])
+    codes = np.searchsorted(bounds, np.asarray(pids, dtype=np.int64) - 1, side="right")
+    return dict(zip(groups, np.bincount(codes, minlength=len(groups)).tolist()))
+
+def verify_probabilities(groups, draws=1000000, workers=None, seed=None):
+    # 多进程蒙特卡洛校验：把抽奖次数分给各进程，汇总后与精确解逐颜色比较。
+    # 连续抽奖结果负相关，卡方检验在这里偏保守
+    workers = max(1, min(workers or os.cpu_count() or 1, draws))
+    base = random.Random(seed).getrandbits(32)
+    chunks = [draws // workers + (i < draws % workers) for i in range(workers)]
+    counts = dict.fromkeys(groups, 0)
+    import multiprocessing
+    # spawn 启动的子进程不继承 Tk 和后台保存线程
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context) as executor:
+        futures = [executor.submit(monte_carlo_worker, groups, n, base + i) for i, n in enumerate(chunks)]
+        for future in futures:
+            for color, count in future.result().items():
+                counts[color] += count
+
+    exact = stationary_probabilities([w for w, n in groups.values()], [n for w, n in groups.values()])
+    colors = {}
+    chi2 = 0.0
+    for (color, (weight, count)), prob in zip(groups.items(), exact):
+        share = prob * count
+        colors[color] = {"exact": share, "observed": counts[color] / draws, "draws": counts[color]}
+        if share > 0:
+            chi2 += (counts[color] - share * draws) ** 2 / (share * draws)
+    dof = sum(1 for info in colors.values() if info["exact"] > 0) - 1
+    return {"draws": draws, "workers": workers, "colors": colors,
+            "chi_square": chi2, "dof": dof, "p_value": chi_square_sf(chi2, dof) if dof > 0 else 1.0}
+
+class DrawHistory:
+    # 抽奖记录：定长二进制记录只追加写入，读取时用 mmap。
+    # 颜色名和每个奖池版本的颜色概率记在 .meta（JSON Lines）里；
+    # 统计量增量更新，关闭时存入 .stats.json，下次启动只需扫描之后新增的记录。
+    # readonly 时不创建、不修复也不改写任何文件，供只读的命令行查询使用。
+    RECORD = struct.Struct("<dqIH")  # 时间戳, 奖项 id, 奖池版本, 颜色序号
+
+    def __init__(self, path="history.bin", readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.meta_path = path + ".meta"
+        self.stats_path = path + ".stats.json"
+        self.last_path = path + ".last"
+        self.colors = []
+        self.color_index = {}
+        self.version_probs = {}
+        self.last_version = 0
+        self.count = 0
+        self.prize_counts = {}
+        self.color_counts = {}
+        self.expected = {}
+
+        meta_size = os.path.getsize(self.meta_path) if os.path.exists(self.meta_path) else 0
+        for entry in read_journal(self.meta_path, repair=not readonly):
+            if "color" in entry:
+                self.color_index[entry["color"]] = len(self.colors)
+                self.colors.append(entry["color"])
+            else:
+                self.version_probs[entry["version"]] = entry["probs"]
+                self.last_version = max(self.last_version, entry["version"])
+
+        self.file = self.meta_file = None
+        if not readonly:
+            # 去掉崩溃时写了一半的记录
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size % self.RECORD.size:
+                with open(path, "r+b") as f:
+                    f.truncate(size - size % self.RECORD.size)
+            self.file = open(path, "ab")
+            self.meta_file = open(self.meta_path, "a", encoding="utf-8")
+            if os.path.getsize(self.meta_path) < meta_size:
+                self.recover_colors()
+
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+            if stats["count"] <= len(self):
+                self.count = stats["count"]
+                self.prize_counts = {int(pid): n for pid, n in stats["prize_counts"].items()}
+                self.color_counts = stats["color_counts"]
+                self.expected = stats["expected"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        for timestamp, pid, color, version in self.read(self.count):
+            self.count_observed(pid, color)
+            self.count_expected(self.version_probs.get(version, {}), 1)
+
+    def __len__(self):
+        return self.size() // self.RECORD.size
+
+    def size(self):
+        if self.file is not None:
+            self.file.flush()
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def recover_colors(self):
+        # .meta 末尾损坏时丢失了部分颜色名，记录里仍引用着这些序号。
+        # 用占位名补齐，之后新出现的颜色不会占用同一个序号
+        used = -1
+        for timestamp, pid, version, color in self.iter_records():
+            used = max(used, color)
+        for index in range(len(self.colors), used + 1):
+            name = self.unknown_color(index)
+            self.color_index[name] = index
+            self.colors.append(name)
+            self.write_meta({"color": name})
+
+    def unknown_color(self, index):
+        return f"未知颜色{index}"
+
+    def iter_records(self, start=0, stop=None):
+        # 按记录号读取原始记录 (时间戳, 奖项 id, 奖池版本, 颜色序号)
+        size = self.size()
+        if size < self.RECORD.size:
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            total = size // self.RECORD.size
+            stop = total if stop is None else min(stop, total)
+            if start >= stop:
+                return
+            view = memoryview(mm)[start * self.RECORD.size:stop * self.RECORD.size]
+            try:
+                yield from self.RECORD.iter_unpack(view)
+            finally:
+                view.release()
+
+    def read(self, start=0, stop=None):
+        # 按记录号读取 (时间戳, 奖项 id, 颜色, 奖池版本)；.meta 里找不到的颜色序号用占位名
+        colors = self.colors
+        for timestamp, pid, version, color in self.iter_records(start, stop):
+            yield timestamp, pid, colors[color] if color < len(colors) else self.unknown_color(color), version
+
+    def last_draw(self):
+        # 最近一次抽中的奖项 id。命令行不写记录时抽到的结果记在 .last 里，
+        # 之后又有新记录（界面或 --record 抽奖）时以记录为准
+        count = len(self)
+        try:
+            with open(self.last_path, "r", encoding="utf-8") as f:
+                last = json.load(f)
+            if last["count"] == count:
+                return last["id"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        for timestamp, pid, version, color in self.iter_records(max(count - 1, 0)):
+            return pid
+        return None
+
+    def remember_last(self, pid):
+        tmp_path = self.last_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"id": pid, "count": len(self)}, f)
+        os.replace(tmp_path, self.last_path)
+
+    def write_meta(self, entry):
+        self.meta_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.meta_file.flush()
+
+    def record(self, draws, version, probs):
+        # draws 为 [(奖项 id, 颜色)]，probs 为当前奖池版本下各颜色的中奖概率
+        if version not in self.version_probs:
+            self.version_probs[version] = probs
+            self.last_version = max(self.last_version, version)
+            self.write_meta({"version": version, "probs": probs})
+
+        timestamp = time.time()
+        records = bytearray()
+        for pid, color in draws:
+            if color not in self.color_index:
+                self.color_index[color] = len(self.colors)
+                self.colors.append(color)
+                self.write_meta({"color": color})
+            records += self.RECORD.pack(timestamp, pid, version, self.color_index[color])
+            self.count_observed(pid, color)
+        self.file.write(records)
+        self.file.flush()
+        self.count_expected(probs, len(draws))
+
+    def count_observed(self, pid, color):
+        self.prize_counts[pid] = self.prize_counts.get(pid, 0) + 1
+        self.color_counts[color] = self.color_counts.get(color, 0) + 1
+
+    def count_expected(self, probs, n):
+        # 期望次数按每次抽奖时的奖池概率累加，奖池变化后依然成立
+        for name, p in probs.items():
+            self.expected[name] = self.expected.get(name, 0.0) + p * n
+        self.count += n
+
+    def chi_square(self):
+        # 按颜色的拟合优度检验，返回 (卡方值, 自由度, p 值)
+        cells = [(self.color_counts.get(name, 0), expected) for name, expected in self.expected.items() if expected > 0]
+        chi2 = sum((observed - expected) ** 2 / expected for observed, expected in cells)
+        dof = len(cells) - 1
+        return chi2, dof, chi_square_sf(chi2, dof)
+
+    def close(self):
+        if self.readonly:
+            return
+        self.file.close()
+        self.meta_file.close()
+        tmp_path = self.stats_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "count": self.count,
+                "prize_counts": self.prize_counts,
+                "color_counts": self.color_counts,
+                "expected": self.expected
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.stats_path)
+
+class LotteryEngine:
+    # 不依赖界面的抽奖逻辑：奖池、颜色设置、勾选计数和抽样器。界面和命令行共用
+    def __init__(self):
+        self.store = PrizeStore()
+        self.color_settings = {}
+        self.sampler = PrizeSampler(lambda: (self.store, self.color_settings))
+        self.history = None  # 设置后每次抽奖都写入抽奖记录
+        self.checked_counts = {}
+        self.total_weight = 0
+        self.effective = False  # 概率显示为不重复规则下的实际概率
+        self.order_stamp = None
+        self.order_cache = {}  # (筛选, 排序键, 降序) → 排好序的 id 列表
+
+    def load_pool(self, persister, lazy=False):
+        # lazy 时奖池先为空，由调用方用 PoolLoader 分片读入
+        self.store.drop_name_index()
+        with METRICS.timer("load_data"):
+            colors, self.store = persister.load(prizes=False) if lazy else persister.load()
+        if os.path.exists(persister.path):
+            METRICS.record("load_data.bytes", os.path.getsize(persister.path))
+        self.color_settings = colors if colors is not None else dict(DEFAULT_COLORS)
+        self.sampler.invalidate()
+        self.recount()
+
+    def load_counts(self, persister):
+        # 只读颜色设置和勾选计数，不读入奖项：只读的分页查询（page_rows）用
+        self.load_pool(persister, lazy=True)
+        for color, count in persister.checked_counts():
+            if color in self.color_settings:
+                self.count_checked(color, count)
+
+    def snapshot(self):
+        return {
+            "colors": {name: dict(config) for name, config in self.color_settings.items()},
+            "columns": self.store.columns(),
+            "next_id": self.store.next_id
+        }
+
+    def recount(self):
+        # 奖池或颜色设置整体变化时全量重算，其余修改走 count_checked 增量更新
+        self.checked_counts = {color: 0 for color in self.color_settings}
+        self.total_weight = 0
+        for (color, checked), members in self.store.members.items():
+            if checked and members:
+                self.count_checked(color, len(members))
+
+    def count_checked(self, color, delta):
+        self.checked_counts[color] = self.checked_counts.get(color, 0) + delta
+        self.total_weight += self.color_settings[color]["weight"] * delta
+
+    def color_probability(self, color):
+        if self.total_weight == 0:
+            return 0.0
+        return self.color_settings[color]["weight"] / self.total_weight
+
+    def effective_probabilities(self):
+        # 每种颜色中单个已勾选奖项的实际长期概率（考虑"与上一次不同"的规则）
+        colors = [color for color, count in self.checked_counts.items() if count]
+        probs = stationary_probabilities([self.color_settings[color]["weight"] for color in colors],
+                                         [self.checked_counts[color] for color in colors])
+        result = dict.fromkeys(self.color_settings, 0.0)
+        result.update(zip(colors, probs))
+        return result
+
+    def display_probabilities(self):
+        if self.effective:
+            return self.effective_probabilities()
+        return {color: self.color_probability(color) for color in self.color_settings}
+
+    def color_shares(self, effective=False):
+        # 各颜色整体的中奖概率
+        probs = self.effective_probabilities() if effective else None
+        return {color: (probs[color] if effective else self.color_probability(color)) * count
+                for color, count in self.checked_counts.items() if count}
+
+    def sampling_groups(self):
+        # 参与抽奖的颜色：{颜色: (权重, 勾选数量)}，供蒙特卡洛校验使用
+        return {color: (self.color_settings[color]["weight"], count)
+                for color, count in self.checked_counts.items()
+                if count and self.color_settings[color]["weight"] > 0}
+
+    def verify_probabilities(self, draws=1000000, workers=None, seed=None):
+        return verify_probabilities(self.sampling_groups(), draws, workers, seed)
+
+    def filter_sorted(self, filter_color="全部", sort_key="默认", reverse=False, query=""):
+        if query:
+            with METRICS.timer("refresh_tree.search"):
+                return self.search_sorted(query, filter_color, sort_key, reverse)
+        if filter_color == "全部" and sort_key not in ("颜色", "权重", "概率"):
+            with METRICS.timer("refresh_tree.compute"):
+                return list(self.store)
+        # 筛选和排序都由分类索引完成
+        with METRICS.timer("refresh_tree.sort"):
+            return self.sorted_order(filter_color, sort_key, reverse)
+
+    def sorted_order(self, filter_color, sort_key, reverse):
+        # 排序键只取决于 (颜色, 是否勾选)，直接读取奖池维护的分类索引，不对奖项逐个排序。
+        # 结果按奖池版本和颜色权重缓存，来回切换排序方式时不重复计算
+        stamp = (self.store, self.store.version, self.effective,
+                 tuple((color, config["weight"]) for color, config in self.color_settings.items()))
+        cache_key = (filter_color, sort_key, reverse)
+        if self.order_stamp != stamp:
+            self.order_stamp = stamp
+            self.order_cache = {}
+        cached = self.order_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        result = self.store.sorted_members(self.sort_keys(filter_color, sort_key), reverse)
+        if len(self.order_cache) >= 4:
+            del self.order_cache[next(iter(self.order_cache))]
+        self.order_cache[cache_key] = result
+        return result
+
+    def search_sorted(self, query, filter_color, sort_key, reverse):
+        # 只对名称匹配的奖项排序：按所在段的名次和行号，与完整列表中的相对顺序一致
+        store = self.store
+        matches = store.search(query)
+        if len(matches) == len(store):
+            return self.filter_sorted(filter_color, sort_key, reverse)
+        if len(matches) * 8 > len(store):
+            # 命中大半个奖池时直接从（已缓存的）完整列表里挑，比重新排序快
+            matches = set(matches)
+            return [pid for pid in self.filter_sorted(filter_color, sort_key, reverse) if pid in matches]
+        ranks = store.segment_ranks(self.sort_keys(filter_color, sort_key), reverse)
+        hits = []
+        for pid in matches:
+            rank = ranks.get((store.color(pid), store.is_checked(pid)))
+            if rank is not None:
+                hits.append((rank, store.rows[pid], pid))
+        hits.sort()
+        return [pid for rank, row, pid in hits]
+
+    def sort_keys(self, filter_color, sort_key):
+        # [(排序键, (颜色, 是否勾选))]
+        if filter_color != "全部" and filter_color not in self.color_settings:
+            raise ValueError(f"未知颜色：{filter_color}")
+        colors = list(self.color_settings) if filter_color == "全部" else [filter_color]
+        if sort_key == "颜色":
+            position = {color: idx for idx, color in enumerate(self.color_settings)}
+            keyed = [(position[color], (color, checked)) for color in colors for checked in (True, False)]
+        elif sort_key == "权重":
+            keyed = [(self.color_settings[color]["weight"], (color, checked))
+                     for color in colors for checked in (True, False)]
+        elif sort_key == "概率":
+            probs = self.display_probabilities()
+            keyed = [(probs[color], (color, True)) for color in colors]
+            keyed += [(0.0, (color, False)) for color in colors]
+        elif sort_key == "默认":
+            keyed = [(0, (color, checked)) for color in colors for checked in (True, False)]
+        else:
+            raise ValueError(f"未知排序：{sort_key}")
+        return keyed
+
+    def draw(self):
+        selected = self.sampler.draw()
+        if selected is not None:
+            self.record_draws([selected])
+        return selected
+
+    def draw_many(self, n, seed=None):
+        results = self.sampler.draw_many(n, seed=seed)
+        self.record_draws(results)
+        return results
+
+    def record_draws(self, pids):
+        if self.history is not None and pids:
+            self.history.record([(pid, self.store.color(pid)) for pid in pids], self.sampler.version,
+                                self.color_shares(effective=True))
+
+    def describe(self, pid):
+        return {"id": pid, "name": self.store.name(pid), "color": self.store.color(pid)}
+
+    def list_rows(self, filter_color="全部", sort_key="默认", reverse=False, offset=0, limit=None, query=""):
+        pids = self.filter_sorted(filter_color, sort_key, reverse, query)
+        pids = pids[offset:] if limit is None else pids[offset:offset + limit]
+        probs = self.display_probabilities()
+        store = self.store
+        return [self.row_info(pid, store.name(pid), store.color(pid), store.is_checked(pid), probs) for pid in pids]
+
+    def page_rows(self, persister, filter_color="全部", sort_key="默认", reverse=False, offset=0, limit=None, query=""):
+        # 与 list_rows 相同，但直接在数据库里分页查询，不需要读入奖池（先调用 load_counts）
+        rows = persister.query_page(self.sort_keys(filter_color, sort_key), reverse, offset, limit, query)
+        probs = self.display_probabilities()
+        return [self.row_info(pid, name, color, checked, probs) for pid, name, color, checked in rows]
+
+    def row_info(self, pid, name, color, checked, probs):
+        return {"id": pid, "name": name, "color": color, "checked": checked,
+                "weight": self.color_settings[color]["weight"],
+                "probability": probs[color] if checked else 0.0}
+
+    def pool_stats(self):
+        shares = self.color_shares()
+        effective = self.effective_probabilities()
+        return {
+            "prizes": len(self.store),
+            "checked": sum(self.checked_counts.values()),
+            "total_weight": self.total_weight,
+            "colors": {color: {
+                "weight": config["weight"],
+                "prizes": self.store.color_count(color),
+                "checked": self.checked_counts.get(color, 0),
+                "probability": self.color_probability(color),
+                "share": shares.get(color, 0.0),
+                "effective": effective[color],
+                "effective_share": effective[color] * self.checked_counts.get(color, 0)
+            } for color, config in self.color_settings.items()}
+        }
+
+def parse_checked(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ("0", "false", "no", "否", "n")
+
+def read_prize_rows(f, fmt):
+    # 逐行读取 CSV（表头 name,color[,checked]）或 JSONL，生成 (名称, 颜色, 是否勾选)；
+    # JSON 文件（奖项数组或 data.json 格式的 {"items": [...]}）只能整体解析
+    if fmt == "csv":
+        for row in csv.DictReader(f):
+            checked = row.get("checked")
+            yield (row.get("name") or "").strip(), (row.get("color") or "").strip(), parse_checked(checked) if checked else True
+        return
+    if fmt == "json":
+        data = json.load(f)
+        items = data.get("items", []) if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise ValueError('JSON 文件应为奖项数组或 {"items": [...]}')
+    else:
+        items = (json.loads(line) for line in f if line.strip())
+    for item in items:
+        if not isinstance(item, dict):
+            yield "", "", True  # 不是对象的行按无效行计
+            continue
+        yield str(item.get("name", "")).strip(), str(item.get("color", "")).strip(), parse_checked(item.get("checked", True))
+
+def bulk_format(path):
+    path = path.lower()
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "json" if path.endswith(".json") else "csv"
+
+class PrizeImporter:
+    # 流式批量导入：每次 step 处理到截止时间为止，全部完成后由调用方统一重算、刷新和保存。
+    # 名称重复（与奖池或文件中前面的行）时跳过，merge 时改用导入行的颜色和勾选状态
+    def __init__(self, engine, path, merge=False):
+        self.engine = engine
+        self.merge = merge
+        self.size = os.path.getsize(path)
+        self.file = open(path, "r", encoding="utf-8-sig", newline="")
+        self.rows = read_prize_rows(self.file, bulk_format(path))
+        store = engine.store
+        self.by_name = {}
+        for row, pid in enumerate(store.ids):
+            if pid:
+                self.by_name.setdefault(store.names[row], pid)
+        self.added = self.merged = self.skipped = self.invalid = 0
+
+    def progress(self):
+        return self.file.buffer.tell() / self.size if self.size and not self.file.closed else 1.0
+
+    def step(self, deadline):
+        store = self.engine.store
+        colors = self.engine.color_settings
+        count = 0
+        for name, color, checked in self.rows:
+            if not name or color not in colors:
+                self.invalid += 1
+            elif name in self.by_name:
+                pid = self.by_name[name]
+                if not self.merge or pid not in store:
+                    self.skipped += 1
+                else:
+                    if store.color(pid) != color:
+                        store.recolor(pid, color)
+                    store.apply({"op": "check", "id": pid, "checked": checked})
+                    self.merged += 1
+            else:
+                self.by_name[name] = store.add(name, color, checked)
+                self.added += 1
+            count += 1
+            if count % 1024 == 0 and time.perf_counter() >= deadline:
+                return False
+        self.close()
+        return True
+
+    def close(self):
+        self.file.close()
+
+    def summary(self):
+        return f"新增 {self.added} 个，合并 {self.merged} 个，跳过重名 {self.skipped} 个，无效行 {self.invalid} 个"
+
+class PrizeExporter:
+    # 流式导出：先写临时文件，完成后再替换目标文件
+    def __init__(self, engine, path):
+        self.store = engine.store
+        self.pids = list(self.store)
+        self.index = 0
+        self.path = path
+        self.fmt = bulk_format(path)
+        self.file = open(path + ".tmp", "w", encoding="utf-8", newline="")
+        if self.fmt == "csv":
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(["name", "color", "checked"])
+        elif self.fmt == "json":
+            self.file.write("[")
+        self.separator = "\n"  # JSON 数组第一项之后改为 ",\n"
+
+    def progress(self):
+        return self.index / len(self.pids) if self.pids else 1.0
+
+    def step(self, deadline):
+        store = self.store
+        while self.index < len(self.pids):
+            # 导出期间被删除的奖项直接跳过
+            batch = [pid for pid in self.pids[self.index:self.index + 1024] if pid in store]
+            self.index += 1024
+            if self.fmt == "csv":
+                self.writer.writerows((store.name(pid), store.color(pid), int(store.is_checked(pid))) for pid in batch)
+            else:
+                lines = [json.dumps({"name": store.name(pid), "color": store.color(pid),
+                                     "checked": store.is_checked(pid)}, ensure_ascii=False) for pid in batch]
+                if self.fmt == "jsonl":
+                    self.file.writelines(line + "\n" for line in lines)
+                elif lines:
+                    self.file.write(self.separator + ",\n".join(lines))
+                    self.separator = ",\n"
+            if time.perf_counter() >= deadline:
+                return False
+        self.index = len(self.pids)
+        if self.fmt == "json":
+            self.file.write("\n]\n")
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+        return True
+
+    def close(self):
+        self.file.close()
+        if os.path.exists(self.path + ".tmp"):
+            os.remove(self.path + ".tmp")
+
+    def summary(self):
+        return f"已导出 {len(self.pids)} 个奖项"
+
+class PoolLoader:
+    # SQLite 奖池分片读入：窗口先显示最先读到的部分，全部读完后由调用方统一重算和刷新。
+    # 读入期间新增的奖项使用预先设好的 next_id，不会与尚未读到的 id 冲突
+    def __init__(self, engine, persister):
+        self.engine = engine
+        conn = persister.reader()
+        self.total = conn.execute("SELECT COUNT(*) FROM prizes").fetchone()[0]
+        self.cursor = persister.read_prizes(conn)
+        self.loaded = 0
+        self.done = False
+
+    def progress(self):
+        return self.loaded / self.total if self.total else 1.0
+
+    def step(self, deadline):
+        store = self.engine.store
+        while True:
+            rows = self.cursor.fetchmany(1024)
+            if not rows:
+                self.close()
+                self.done = True
+                return True
+            for pid, name, color, checked in rows:
+                store.add(name, color, bool(checked), pid)
+            self.loaded += len(rows)
+            if time.perf_counter() >= deadline:
+                return False
+
+    def close(self):
+        self.cursor.close()
+
+    def summary(self):
+        return ""  # 读完不提示
+
+def open_pool_files(name, on_error=None, readonly=False):
+    # 返回奖池的 (存储, 抽奖记录)
+    if name == DEFAULT_POOL:
+        base, history_path = "data", "history.bin"
+    else:
+        if not readonly:
+            os.makedirs(POOLS_DIR, exist_ok=True)
+        base = os.path.join(POOLS_DIR, name)
+        history_path = base + ".history.bin"
+    # 只读且还没有迁移到数据库时直接读 JSON 文件，不创建数据库
+    if STORAGE_BACKEND == "sqlite" and not (readonly and not os.path.exists(base + ".db")):
+        persister = SqlitePersister(base + ".db", base + ".json", on_error=on_error)
+    else:
+        persister = DataPersister(base + ".json", on_error=on_error)
+    return persister, DrawHistory(history_path, readonly)
+
+def list_pools():
+    # SQLite 存储下，还没迁移的奖池只有 .json 文件，第一次打开时迁移
+    exts = (".db", ".json") if STORAGE_BACKEND == "sqlite" else (".json",)
+    names = set()
+    if os.path.isdir(POOLS_DIR):
+        for name in os.listdir(POOLS_DIR):
+            if name.endswith(".history.bin.stats.json"):
+                continue
+            for ext in exts:
+                if name.endswith(ext):
+                    names.add(name[:-len(ext)])
+    return [DEFAULT_POOL] + sorted(names)
+
+def valid_pool_name(name):
+    return bool(name) and name != DEFAULT_POOL and not name.startswith(".") and \
+        ".history.bin" not in name and not any(c in name for c in '\\/:*?"<>|')
+
+class Playlist:
+    # 播放列表：文件在后台线程读入内存（网络盘上最慢的一步），最近的几首留在 LRU 缓存里。
+    # 缓存只在读取线程里访问，界面线程拿到的是 Future
+    def __init__(self, cache_tracks=MUSIC_CACHE_TRACKS, cache_bytes=MUSIC_CACHE_BYTES):
+        self.tracks = []
+        self.index = 0
+        self.cache = OrderedDict()  # 路径 → 文件内容
+        self.cache_tracks = cache_tracks
+        self.cache_bytes = cache_bytes
+        self.loader = concurrent.futures.ThreadPoolExecutor(1)
+
+    @staticmethod
+    def scan(folder):
+        return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                      if name.lower().endswith(MUSIC_EXTENSIONS))
+
+    def set_tracks(self, tracks):
+        self.tracks = list(tracks)
+        self.index = 0
+
+    def next_index(self, index=None):
+        index = self.index if index is None else index
+        return index + 1 if index + 1 < len(self.tracks) else None
+
+    def fetch(self, index):
+        return self.loader.submit(self.read, self.tracks[index])
+
+    def read(self, path):
+        # 读取线程
+        data = self.cache.pop(path, None)
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        self.cache[path] = data
+        while len(self.cache) > 1 and (len(self.cache) > self.cache_tracks or
+                                       sum(map(len, self.cache.values())) > self.cache_bytes):
+            self.cache.popitem(last=False)
+        return data
+
+    def close(self):
+        self.loader.shutdown(wait=False, cancel_futures=True)
+
+def music_source(path, data):
+    # pygame 从内存流式解码，namehint 告诉它文件格式
+    return io.BytesIO(data), os.path.splitext(path)[1].lstrip(".").lower()
+
+TERM_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+
+def note_terms(text, query=False):
+    # 中文切成单字和相邻两字，其余按字母数字连续串切分并转小写；
+    # 查询时两字以上的中文只用两字词，单字才用单字
+    terms = []
+    for run in TERM_PATTERN.findall(text.lower()):
+        if run.isascii():
+            terms.append(run)
+            continue
+        if not query or len(run) == 1:
+            terms.extend(run)
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+class NotesIndex:
+    # 笔记全文索引：倒排表存放在 SQLite 中，按文件修改时间和大小增量更新，BM25 排序。
+    # 界面在后台线程调用，用锁串行化
+    def __init__(self, notes_dir=NOTES_DIR, path=NOTES_INDEX_PATH):
+        self.notes_dir = notes_dir
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, name TEXT UNIQUE,
+                                                 mtime INTEGER, size INTEGER, length INTEGER);
+                CREATE TABLE IF NOT EXISTS postings (term TEXT, doc INTEGER, tf INTEGER,
+                                                     PRIMARY KEY (term, doc)) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);
+            """)
+
+    def update(self):
+        # 只重新索引新增或修改过的文件，返回 (更新数, 删除数)
+        with self.lock:
+            known = {name: (mtime, size) for name, mtime, size in self.conn.execute("SELECT name, mtime, size FROM docs")}
+            changed = []
+            seen = set()
+            if os.path.isdir(self.notes_dir):
+                for entry in os.scandir(self.notes_dir):
+                    if entry.is_file() and entry.name.endswith((".txt", ".md")):
+                        stat = entry.stat()
+                        seen.add(entry.name)
+                        if known.get(entry.name) != (stat.st_mtime_ns, stat.st_size):
+                            changed.append((entry.name, stat.st_mtime_ns, stat.st_size))
+            removed = known.keys() - seen
+
+            with self.conn:
+                for name in removed:
+                    self.remove_doc(name)
+                for name, mtime, size in changed:
+                    try:
+                        with open(os.path.join(self.notes_dir, name), "r", encoding="utf-8", errors="replace") as f:
+                            text = f.read()
+                    except OSError:
+                        continue
+                    self.remove_doc(name)
+                    terms = {}
+                    for term in note_terms(text):
+                        terms[term] = terms.get(term, 0) + 1
+                    doc = self.conn.execute("INSERT INTO docs (name, mtime, size, length) VALUES (?, ?, ?, ?)",
+                                            (name, mtime, size, sum(terms.values()))).lastrowid
+                    self.conn.executemany("INSERT INTO postings (term, doc, tf) VALUES (?, ?, ?)",
+                                          ((term, doc, tf) for term, tf in terms.items()))
+            return len(changed), len(removed)
+
+    def remove_doc(self, name):
+        row = self.conn.execute("SELECT id FROM docs WHERE name = ?", (name,)).fetchone()
+        if row:
+            self.conn.execute("DELETE FROM postings WHERE doc = ?", row)
+            self.conn.execute("DELETE FROM docs WHERE id = ?", row)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def search(self, query, limit=20):
+        # 所有词都出现的笔记按 BM25 得分排序，返回 [(文件名, 得分, 摘要)]
+        terms = list(dict.fromkeys(note_terms(query, query=True)))
+        if not terms:
+            return []
+        marks = ", ".join("?" * len(terms))
+        with self.lock:
+            count, avg_length = self.conn.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+            df = dict(self.conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({marks}) GROUP BY term", terms))
+            if len(df) < len(terms):
+                return []
+            postings = self.conn.execute(
+                f"SELECT p.doc, p.term, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc "
+                f"WHERE p.term IN ({marks})", terms).fetchall()
+
+        k1, b = 1.2, 0.75
+        scores = {}
+        hits = {}
+        for doc, term, tf, length in postings:
+            idf = math.log(1 + (count - df[term] + 0.5) / (df[term] + 0.5))
+            norm = k1 * (1 - b + b * length / (avg_length or 1))
+            scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+            hits[doc] = hits.get(doc, 0) + 1
+        ranked = sorted((doc for doc in scores if hits[doc] == len(terms)), key=scores.get, reverse=True)[:limit]
+        if not ranked:
+            return []
+        with self.lock:
+            names = dict(self.conn.execute(
+                f"SELECT id, name FROM docs WHERE id IN ({', '.join('?' * len(ranked))})", ranked))
+        return [(names[doc], scores[doc], self.snippet(names[doc], query, terms)) for doc in ranked]
+
+    def snippet(self, name, query, terms, width=30):
+        # 只读取排在前面的文件来截取摘要
+        try:
+            with open(os.path.join(self.notes_dir, name), "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            return ""
+        lower = text.lower()
+        pos = lower.find(query.strip().lower())
+        for term in terms:
+            if pos >= 0:
+                break
+            pos = lower.find(term)
+        pos = max(pos, 0)
+        start = max(0, pos - width)
+        end = pos + width * 2
+        return ("…" if start else "") + " ".join(text[start:end].split()) + ("…" if end < len(text) else "")
+
+    def close(self):
+        self.conn.close()
+
+# 切换奖池时整体换入换出的状态
+POOL_STATE = ("persister", "history", "store", "color_settings", "sampler", "checked_counts", "total_weight")
+
+class LotteryApp(LotteryEngine):
+    def __init__(self, root, profile_startup=False):
+        super().__init__()
         self.root = root
         self.root.title("任务决策助手")
-        self.data = []
-        self.color_settings = {}
         self.filter_color = tk.StringVar(value="全部")
         self.sort_by = tk.StringVar(value="默认")
         self.sort_order = tk.StringVar(value="升序")
-        self.last_selected = None
+        self.virtual_mode = tk.BooleanVar(value=False)
+        self.effective_mode = tk.BooleanVar(value=False)
+        self.search_text = tk.StringVar(value="")
+        self.search_job = None
+        self.rows = {}
+        self.row_order = []
+        self.filtered = []
+        self.view_offset = 0
+        self.view_rows = 20
+        self.save_job = None
+        self.held_save = False  # 奖池分片读入期间推迟的整体保存
+        self.bulk_job = None
+        self.lag_job = None
+        self.notes_index = None
+        self.note_editors = {}  # 文件路径 → 编辑窗口
+        self.wheel = None
+        self.on_save_error = lambda e: self.root.after(
+            0, lambda: messagebox.showerror("保存失败", f"自动保存失败：{str(e)}"))
+        self.pool_name = DEFAULT_POOL
+        self.pool_var = tk.StringVar(value=DEFAULT_POOL)
+        self.pools = OrderedDict()  # 其他已加载的奖池：名称 → 状态，最近用过的在最后
+        self.persister, self.history = open_pool_files(DEFAULT_POOL, self.on_save_error)
+        self.sampler.version = self.history.last_version
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        self.setup_ui()
-        self.load_data()
-        self.setup_style()
-        self.setup_menu()
-        
-        pygame.mixer.init()
-        self.current_music = None
+        self.playlist = Playlist()
         self.is_playing = False
+        self.music_paused = False
+        self.music_token = 0  # 每次切歌加一，丢弃过期的加载结果
+        self.queued_index = None  # 已经交给 music.queue 的曲目
+        self.music_pos = 0
+        self.music_poll_job = None
+        self.music_loading = False
+        self.mixer_ready = False
+        self.profile_startup = profile_startup
+        self.startup_times = {"imports": IMPORTS_DONE - STARTUP_START}
+        
+        self.timed("setup_ui", self.setup_ui)
+        self.timed("load_data", self.load_data)
+        self.setup_style()
+        self.timed("setup_menu", self.setup_menu)
+        if METRICS.enabled:
+            self.watch_event_loop()
+
+        # 第一次空闲时窗口已经完成绘制
+        self.paint_start = time.perf_counter()
+        self.root.after_idle(self.on_first_paint)
+
+    def toggle_effective(self):
+        self.effective = self.effective_mode.get()
+        self.refresh_tree()
+
+    def toggle_diagnostics(self):
+        METRICS.enabled = self.diagnostics_enabled.get()
+        if self.lag_job is not None:
+            # 关掉又很快打开时，旧的定时器还没触发，先取消，避免同时跑两条
+            self.root.after_cancel(self.lag_job)
+            self.lag_job = None
+        if METRICS.enabled:
+            self.watch_event_loop()
+
+    def watch_event_loop(self, expected=None):
+        # 定时器实际触发时间比预期晚多少，就是事件循环被阻塞的时间
+        now = time.perf_counter()
+        self.lag_job = None
+        if expected is not None:
+            METRICS.record("tk.lag", (now - expected) * 1000)
+        if METRICS.enabled:
+            self.lag_job = self.root.after(LAG_INTERVAL_MS, self.watch_event_loop, now + LAG_INTERVAL_MS / 1000)
+
+    def timed(self, phase, func):
+        start = time.perf_counter()
+        func()
+        self.startup_times[phase] = time.perf_counter() - start
+
+    def on_first_paint(self):
+        self.startup_times["first_paint"] = time.perf_counter() - self.paint_start
+        # 快捷功能面板不影响首屏，等窗口显示后再创建
+        self.root.after_idle(self.setup_shortcut_panel)
+        if AUTO_CHECK_UPDATES:
+            check_for_updates(self.root, silent=True)
+        if self.profile_startup:
+            print("启动耗时：")
+            for phase, seconds in self.startup_times.items():
+                print(f"  {phase:<12}{seconds * 1000:8.1f} ms")
+            print(f"  {'total':<12}{(time.perf_counter() - STARTUP_START) * 1000:8.1f} ms")
 
     def setup_style(self):
         self.style = ttk.Style()
-        self.style.configure("Treeview", rowheight=25)
+        self.style.configure("Treeview", rowheight=ROW_HEIGHT)
         self.style.map("Treeview", background=[("selected", "#0000ff")])
 
     def setup_menu(self):
@@ -47,10 +1806,22 @@ class LotteryApp:
         settings_menu = tk.Menu(menubar, tearoff=0)
         settings_menu.add_command(label="颜色设置", command=self.open_color_settings)
         menubar.add_cascade(label="设置", menu=settings_menu)
+
+        history_menu = tk.Menu(menubar, tearoff=0)
+        history_menu.add_command(label="抽奖统计", command=lambda: HistoryStatsWindow(self.root, self))
+        history_menu.add_command(label="概率校验", command=lambda: ProbabilityCheckWindow(self.root, self))
+        menubar.add_cascade(label="记录", menu=history_menu)
         
         update_menu = tk.Menu(menubar, tearoff=0)
-        update_menu.add_command(label="检查更新", command=check_for_updates)
+        update_menu.add_command(label="检查更新", command=lambda: check_for_updates(self.root))
         menubar.add_cascade(label="更新", menu=update_menu)
+
+        diagnostics_menu = tk.Menu(menubar, tearoff=0)
+        self.diagnostics_enabled = tk.BooleanVar(value=METRICS.enabled)
+        diagnostics_menu.add_checkbutton(label="启用统计", variable=self.diagnostics_enabled,
+                                         command=self.toggle_diagnostics)
+        diagnostics_menu.add_command(label="诊断面板", command=lambda: DiagnosticsWindow(self.root))
+        menubar.add_cascade(label="诊断", menu=diagnostics_menu)
         
         self.root.config(menu=menubar)
 
@@ -69,23 +1840,39 @@ class LotteryApp:
 
         ttk.Button(input_frame, text="添加", command=self.add_prize).grid(row=0, column=4, padx=5)
 
+        ttk.Label(input_frame, text="奖池:").grid(row=0, column=5, padx=(20,5))
+        pool_combo = ttk.Combobox(input_frame, textvariable=self.pool_var, state="readonly", width=12,
+                                  values=list_pools())
+        pool_combo.configure(postcommand=lambda: pool_combo.configure(values=list_pools()))
+        pool_combo.grid(row=0, column=6, padx=5)
+        pool_combo.bind("<<ComboboxSelected>>", lambda e: self.switch_pool(self.pool_var.get()))
+        ttk.Button(input_frame, text="新建奖池", command=self.new_pool).grid(row=0, column=7, padx=5)
+
         # 控制面板
         control_frame = ttk.Frame(self.root)
         control_frame.pack(pady=5, fill=tk.X)
 
         ttk.Button(control_frame, text="删除选中", command=self.delete_selected).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="保存数据", command=self.auto_save).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="导入", command=self.import_prizes).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="导出", command=self.export_prizes).pack(side=tk.LEFT, padx=5)
 
         # 筛选和排序
         filter_frame = ttk.Frame(self.root)
         filter_frame.pack(pady=5, fill=tk.X)
 
-        ttk.Label(filter_frame, text="筛选:").pack(side=tk.LEFT)
-        filter_combo = ttk.Combobox(filter_frame, textvariable=self.filter_color, 
+        ttk.Label(filter_frame, text="搜索:").pack(side=tk.LEFT)
+        search_entry = ttk.Entry(filter_frame, textvariable=self.search_text, width=12)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        search_entry.bind("<Escape>", lambda e: self.search_text.set(""))
+        self.search_text.trace_add("write", lambda *args: self.schedule_search())
+
+        ttk.Label(filter_frame, text="筛选:").pack(side=tk.LEFT, padx=(10,0))
+        self.filter_combo = ttk.Combobox(filter_frame, textvariable=self.filter_color, 
                                   values=["全部"] + list(self.color_settings.keys()), 
                                   state="readonly", width=8)
-        filter_combo.pack(side=tk.LEFT, padx=5)
-        filter_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh_tree())
+        self.filter_combo.pack(side=tk.LEFT, padx=5)
+        self.filter_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh_tree())
 
         ttk.Label(filter_frame, text="排序:").pack(side=tk.LEFT, padx=(10,0))
         sort_combo = ttk.Combobox(filter_frame, textvariable=self.sort_by, 
@@ -97,10 +1884,20 @@ class LotteryApp:
                    values=["升序", "降序"], state="readonly", width=6).pack(side=tk.LEFT, padx=5)
         self.sort_order.trace_add("write", lambda *args: self.refresh_tree())
 
+        ttk.Checkbutton(filter_frame, text="虚拟列表", variable=self.virtual_mode,
+                        command=self.refresh_tree).pack(side=tk.LEFT, padx=(10,0))
+        ttk.Checkbutton(filter_frame, text="实际概率", variable=self.effective_mode,
+                        command=self.toggle_effective).pack(side=tk.LEFT, padx=(10,0))
+
         # 奖池列表
-        self.tree = ttk.Treeview(self.root, columns=("checked", "name", "color", "weight", "probability"), 
-                               show="headings", selectmode="browse")
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        tree_frame = ttk.Frame(self.root)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        self.tree = ttk.Treeview(tree_frame, columns=("checked", "name", "color", "weight", "probability"), 
+                               show="headings", selectmode="browse", yscrollcommand=self.on_tree_yscroll)
+        self.scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
         columns = {
             "checked": {"text": "✓", "width": 30},
@@ -115,20 +1912,103 @@ class LotteryApp:
             self.tree.column(col, width=config["width"], anchor="center")
 
         self.tree.bind("<Button-1>", self.on_tree_click)
+        self.tree.bind("<Configure>", self.on_tree_configure)
+        self.tree.bind("<MouseWheel>", lambda e: self.on_mousewheel(-e.delta // 120))
+        self.tree.bind("<Button-4>", lambda e: self.on_mousewheel(-1))
+        self.tree.bind("<Button-5>", lambda e: self.on_mousewheel(1))
 
         # 抽奖区域
         result_frame = ttk.Frame(self.root)
         result_frame.pack(pady=10, fill=tk.X)
 
         ttk.Button(result_frame, text="开始抽奖", command=self.draw_lottery).pack(side=tk.LEFT, padx=5)
+        ttk.Button(result_frame, text="转盘", command=self.open_wheel).pack(side=tk.LEFT, padx=5)
         self.result_label = ttk.Label(result_frame, text="", font=("Arial", 12))
         self.result_label.pack(side=tk.LEFT, padx=10)
-        self.setup_shortcut_panel()
 
     def update_color_combo(self):
         self.color_combo["values"] = list(self.color_settings.keys())
         if self.color_combo["values"]:
             self.color_combo.current(0)
+        self.filter_combo["values"] = ["全部"] + list(self.color_settings.keys())
+        if self.filter_color.get() not in self.color_settings:
+            self.filter_color.set("全部")
+
+    def switch_pool(self, name):
+        # 切换奖池：已加载的奖池直接换回解析好的状态，否则读取它的文件
+        if name == self.pool_name:
+            return
+        if self.bulk_job is not None:
+            messagebox.showwarning("请稍候", "正在导入、导出或加载奖池")
+            self.pool_var.set(self.pool_name)
+            return
+        if self.save_job is not None:
+            self.root.after_cancel(self.save_job)
+            self.flush_save()
+
+        state = self.pools.pop(name, None)
+        fresh = state is None
+        if state is None:
+            try:
+                state = self.load_pool_state(name)
+            except Exception as e:
+                messagebox.showerror("加载失败", f"加载奖池失败：{str(e)}")
+                self.pool_var.set(self.pool_name)
+                return
+        self.pools[self.pool_name] = {key: getattr(self, key) for key in POOL_STATE}
+        for key, value in state.items():
+            setattr(self, key, value)
+        self.pool_name = name
+        self.pool_var.set(name)
+        self.root.title("任务决策助手" if name == DEFAULT_POOL else f"任务决策助手 - {name}")
+
+        # 超出容量时关闭最久没用的奖池（关闭时会写完它尚未保存的修改）
+        while len(self.pools) >= POOL_CACHE_SIZE:
+            old_name, old = self.pools.popitem(last=False)
+            old["persister"].close()
+            old["history"].close()
+
+        self.update_color_combo()
+        self.update_tags()
+        self.view_offset = 0
+        if fresh and self.persister.lazy:
+            self.start_pool_loader()
+            return
+        self.store.build_name_index()
+        if len(self.store) > VIRTUAL_LIST_THRESHOLD:
+            self.virtual_mode.set(True)
+        self.refresh_tree()
+
+    def load_pool_state(self, name):
+        persister, history = open_pool_files(name, self.on_save_error)
+        try:
+            engine = LotteryEngine()
+            engine.load_pool(persister, lazy=persister.lazy)
+        except Exception:
+            persister.close()
+            history.close()
+            raise
+        sampler = PrizeSampler(lambda: (self.store, self.color_settings))
+        sampler.version = history.last_version
+        sampler.invalidate()  # 与 load_pool 一样开始新的版本，奖池在两次运行之间可能改过
+        return {"persister": persister, "history": history, "store": engine.store,
+                "color_settings": engine.color_settings, "sampler": sampler,
+                "checked_counts": engine.checked_counts, "total_weight": engine.total_weight}
+
+    def new_pool(self):
+        name = simpledialog.askstring("新建奖池", "奖池名称:", parent=self.root)
+        if name is None:
+            return
+        name = name.strip()
+        if not valid_pool_name(name):
+            messagebox.showwarning("错误", "奖池名称无效")
+            return
+        if name in list_pools():
+            messagebox.showwarning("错误", "奖池已存在")
+            return
+        self.switch_pool(name)
+        if self.pool_name == name:
+            self.auto_save()  # 立即生成奖池文件
 
     def add_prize(self):
         name = self.name_entry.get().strip()
@@ -141,24 +2021,100 @@ class LotteryApp:
             messagebox.showwarning("错误", "请选择颜色分类")
             return
             
-        self.data.append({
-            "name": name,
-            "color": color,
-            "checked": True
-        })
+        pid = self.store.add(name, color)
+        self.count_checked(color, 1)
+        self.sampler.invalidate()
         self.name_entry.delete(0, tk.END)
         self.refresh_tree()
-        self.auto_save()
+        self.auto_save({"op": "add", "id": pid, "name": name, "color": color, "checked": True})
+
+    def import_prizes(self):
+        if self.bulk_job is not None:
+            messagebox.showwarning("请稍候", "正在导入、导出或加载奖池")
+            return
+        path = filedialog.askopenfilename(filetypes=[("CSV", "*.csv"), ("JSONL", "*.jsonl"), ("JSON", "*.json"),
+                                                     ("所有文件", "*.*")])
+        if not path:
+            return
+        merge = messagebox.askyesnocancel("重名奖项", "与已有奖项重名时：\n是 - 合并（更新颜色和勾选状态）\n否 - 跳过")
+        if merge is None:
+            return
+        try:
+            job = PrizeImporter(self, path, merge)
+        except Exception as e:
+            messagebox.showerror("导入失败", f"导入失败：{str(e)}")
+            return
+        self.run_bulk(job, "导入")
+
+    def export_prizes(self):
+        if self.bulk_job is not None:
+            messagebox.showwarning("请稍候", "正在导入、导出或加载奖池")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSONL", "*.jsonl"), ("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            job = PrizeExporter(self, path)
+        except Exception as e:
+            messagebox.showerror("导出失败", f"导出失败：{str(e)}")
+            return
+        self.run_bulk(job, "导出")
+
+    def run_bulk(self, job, title):
+        # 分片执行：每片最多占用 BULK_SLICE_MS，片与片之间让出事件循环
+        self.bulk_job = job
+        window = BulkProgressWindow(self.root, title)
+
+        def tick():
+            try:
+                done = job.step(time.perf_counter() + BULK_SLICE_MS / 1000)
+            except Exception as e:
+                job.close()
+                self.finish_bulk(job, window)
+                messagebox.showerror(f"{title}失败", f"{title}失败：{str(e)}")
+                return
+            window.set_progress(job.progress())
+            if done:
+                self.finish_bulk(job, window)
+                if job.summary():
+                    messagebox.showinfo(f"{title}完成", job.summary())
+            else:
+                self.root.after(1, tick)
+
+        self.root.after(0, tick)
+
+    def finish_bulk(self, job, window):
+        self.bulk_job = None
+        if window is not None:
+            window.destroy()
+        if isinstance(job, (PrizeImporter, PoolLoader)):
+            # 出错时已读入的部分同样保留，统一重算、刷新；导入的结果再整体保存一次
+            self.sampler.invalidate()
+            self.recount()
+            self.refresh_tree()
+            if isinstance(job, PrizeImporter):
+                self.auto_save()
+            else:
+                self.store.build_name_index()
+                # 读入出错时奖池不完整，推迟的整体保存不再写入
+                if self.held_save:
+                    self.held_save = False
+                    if job.done:
+                        self.flush_save()
 
     def delete_selected(self):
         selected = self.tree.selection()
         if not selected:
             return
             
-        index = self.tree.index(selected[0])
-        del self.data[index]
+        pid = int(selected[0])
+        if self.store.is_checked(pid):
+            self.count_checked(self.store.color(pid), -1)
+        self.store.remove(pid)
+        self.sampler.invalidate()
         self.refresh_tree()
-        self.auto_save()
+        self.auto_save({"op": "remove", "id": pid})
 
     def on_tree_click(self, event):
         region = self.tree.identify("region", event.x, event.y)
@@ -166,108 +2122,241 @@ class LotteryApp:
             column = self.tree.identify_column(event.x)
             item = self.tree.identify_row(event.y)
             if column == "#1":  # 勾选列
-                index = self.tree.index(item)
-                
-                for i in range(len(self.data)):
-                    if self.data[i]["name"] == self.filtered[index]["name"]:
-                        self.data[i]["checked"] = not self.data[i]["checked"]
-                        print(self.data[i])
-                        break
+                pid = int(item)
+                checked = self.store.toggle(pid)
+                self.count_checked(self.store.color(pid), 1 if checked else -1)
                 
+                self.sampler.invalidate()
                 self.refresh_tree()
-                self.auto_save()
+                self.auto_save({"op": "check", "id": pid, "checked": checked})
 
-    def refresh_tree(self):
+    def recount(self):
+        super().recount()
+        self.update_tags()
+
+    def update_tags(self):
         # 更新颜色标签
         for color_name, config in self.color_settings.items():
             self.tree.tag_configure(config["color"], background=config["color"])
-        
-        # 计算真实概率
-        total_weight = sum(self.color_settings[item["color"]]["weight"] 
-                          for item in self.data if item["checked"])
-        
-        for item in self.data:
-            if total_weight == 0 or not item["checked"]:
-                item["probability"] = 0.0
+
+    def schedule_search(self):
+        # 停止输入 SEARCH_DELAY_MS 后才刷新列表
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY_MS, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        self.view_offset = 0
+        self.refresh_tree()
+
+    def refresh_tree(self):
+        self.filtered = self.filter_sorted(self.filter_color.get(), self.sort_by.get(),
+                                           self.sort_order.get() == "降序", self.search_text.get().strip())
+        with METRICS.timer("refresh_tree.render"):
+            self.render_rows()
+        if self.wheel is not None:
+            self.wheel.rebuild_if_changed()
+
+    def render_rows(self):
+        # 虚拟列表模式下只渲染可见窗口内的行
+        if self.virtual_mode.get():
+            self.view_offset = max(0, min(self.view_offset, len(self.filtered) - self.view_rows))
+            visible = self.filtered[self.view_offset:self.view_offset + self.view_rows]
+        else:
+            self.view_offset = 0
+            visible = self.filtered
+
+        # 每种颜色的显示值只计算一次
+        display = {}
+        probs = self.display_probabilities()
+        for color_name, config in self.color_settings.items():
+            prob = probs[color_name]
+            display[color_name] = (config["weight"], f"{prob:.2%}" if prob > 0 else "0.00%", config["color"])
+
+        rows = {}
+        order = []
+        store = self.store
+        for pid in visible:
+            iid = str(pid)
+            row = store.rows[pid]
+            color = store.colors[row]
+            checked = store.checked[row]
+            weight, prob_text, tag = display[color]
+            rows[iid] = ((
+                "✓" if checked else "",
+                store.names[row],
+                color,
+                weight,
+                prob_text if checked else "0.00%"
+            ), tag)
+            order.append(iid)
+
+        # 更新Treeview：只删除、插入、修改有变化的行
+        removed = [iid for iid in self.rows if iid not in rows]
+        if removed:
+            self.tree.delete(*removed)
+        current = [iid for iid in self.row_order if iid in rows]
+        for iid, (values, tag) in rows.items():
+            old = self.rows.get(iid)
+            if old is None:
+                self.tree.insert("", "end", iid=iid, values=values, tags=(tag,))
+                current.append(iid)
+            elif old != (values, tag):
+                self.tree.item(iid, values=values, tags=(tag,))
+
+        # 顺序变化时从第一个不一致的位置开始移动
+        if current != order:
+            start = next(i for i, (a, b) in enumerate(zip(current, order)) if a != b)
+            for index in range(start, len(order)):
+                self.tree.move(order[index], "", index)
+
+        self.rows = rows
+        self.row_order = order
+
+        if self.virtual_mode.get():
+            total = len(self.filtered)
+            if total:
+                self.scrollbar.set(self.view_offset / total, (self.view_offset + len(visible)) / total)
             else:
-                item["probability"] = (self.color_settings[item["color"]]["weight"] 
-                                      / total_weight)
+                self.scrollbar.set(0, 1)
 
-        # 应用筛选
-        filter_color = self.filter_color.get()
-        self.filtered = [item for item in self.data 
-                   if filter_color == "全部" or item["color"] == filter_color]
+    def on_tree_yscroll(self, first, last):
+        # 虚拟列表模式下滚动条由 view_offset 决定，忽略Treeview自身的滚动范围
+        if not self.virtual_mode.get():
+            self.scrollbar.set(first, last)
 
-        # 应用排序
-        sort_key = self.sort_by.get()
-        reverse = self.sort_order.get() == "降序"
-        
-        if sort_key == "颜色":
-            color_order = {color: idx for idx, color in enumerate(self.color_settings)}
-            self.filtered.sort(key=lambda x: color_order[x["color"]], reverse=reverse)
-        elif sort_key == "权重":
-            self.filtered.sort(key=lambda x: self.color_settings[x["color"]]["weight"], reverse=reverse)
-        elif sort_key == "概率":
-            self.filtered.sort(key=lambda x: x["probability"], reverse=reverse)
+    def on_scrollbar(self, *args):
+        if not self.virtual_mode.get():
+            self.tree.yview(*args)
+            return
 
-        # 更新Treeview
-        self.tree.delete(*self.tree.get_children())
-        
-        for item in self.filtered:
-            checked = "✓" if item["checked"] else ""
-            color_config = self.color_settings[item["color"]]
-            prob = item["probability"]
-            self.tree.insert("", "end", values=(
-                checked,
-                item["name"],
-                item["color"],
-                color_config["weight"],
-                f"{prob:.2%}" if prob > 0 else "0.00%"
-            ), tags=(color_config["color"],))
+        if args[0] == "moveto":
+            offset = int(float(args[1]) * len(self.filtered))
+        else:
+            step = int(args[1]) * (self.view_rows if args[2] == "pages" else 1)
+            offset = self.view_offset + step
+        self.scroll_to(offset)
+
+    def on_mousewheel(self, units):
+        if self.virtual_mode.get():
+            self.scroll_to(self.view_offset + units * 3)
+            return "break"
+
+    def on_tree_configure(self, event):
+        rows = max(1, event.height // ROW_HEIGHT - 1)  # 减去表头
+        if rows != self.view_rows:
+            self.view_rows = rows
+            if self.virtual_mode.get():
+                self.render_rows()
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.filtered) - self.view_rows))
+        if offset != self.view_offset:
+            self.view_offset = offset
+            self.render_rows()
 
     def draw_lottery(self):
-        candidates = [item for item in self.data if item["checked"]]
-        if not candidates:
+        if isinstance(self.bulk_job, PoolLoader):
+            messagebox.showwarning("请稍候", "奖池还在加载")
+            return
+        with METRICS.timer("draw"):
+            selected = self.draw()
+        if selected is None:
             messagebox.showwarning("错误", "没有可抽选的奖项")
             return
         
-        if len(candidates) == 1:
-            selected = candidates[0]
+        text = f"中奖结果：{self.store.name(selected)} ({self.store.color(selected)})"
+        if self.wheel is not None:
+            # 转盘停下后再显示结果
+            self.result_label.config(text="抽奖中...")
+            self.wheel.spin(selected, lambda: self.result_label.config(text=text))
         else:
-            weights = [self.color_settings[item["color"]]["weight"] for item in candidates]
-            while True:
-                selected = random.choices(candidates, weights=weights, k=1)[0]
-                if self.last_selected is None or selected != self.last_selected:
-                    break
-        
-        
-        self.last_selected = selected
-        self.result_label.config(text=f"中奖结果：{selected['name']} ({selected['color']})")
+            self.result_label.config(text=text)
+
+    def open_wheel(self):
+        if self.wheel is not None:
+            self.wheel.lift()
+            return
+        self.wheel = WheelWindow(self.root, self)
+
+    def auto_save(self, change=None):
+        # 单条修改只追加日志；其余情况延迟一段时间后合并为一次整体保存
+        with METRICS.timer("auto_save"):
+            if change is not None and self.persister.journal:
+                if not self.persister.append(change):
+                    return
+            if self.save_job is None:
+                self.save_job = self.root.after(SAVE_DELAY_MS, self.flush_save)
+
+    def flush_save(self):
+        self.save_job = None
+        if isinstance(self.bulk_job, PoolLoader):
+            # 奖池还没读完，整体保存会用已读入的部分覆盖整个奖池；读完后再保存
+            self.held_save = True
+            return
+        self.persister.write(self.snapshot())
+
+    def on_close(self):
+        if self.save_job is not None:
+            self.root.after_cancel(self.save_job)
+            self.flush_save()
+        if self.held_save:
+            # 关闭时奖池还在分片读入：先读完，再写推迟的整体保存
+            job = self.bulk_job
+            try:
+                job.step(float("inf"))
+            except Exception:
+                job.close()
+            self.bulk_job = None
+            self.held_save = False
+            if job.done:
+                self.persister.write(self.snapshot())
+        self.persister.close()
+        self.history.close()
+        for state in self.pools.values():
+            state["persister"].close()
+            state["history"].close()
+        for editor in list(self.note_editors.values()):
+            editor.close()
+        if self.notes_index is not None:
+            self.notes_index.close()
+        self.playlist.close()
+        if self.mixer_ready:
+            self.get_mixer().quit()
+        self.root.destroy()
 
-    def auto_save(self):
+    def load_data(self):
         try:
-            save_data = {
-                "colors": self.color_settings,
-                "items": self.data
-            }
-            with open("data.json", "w", encoding="utf-8") as f:
-                json.dump(save_data, f, ensure_ascii=False, indent=2)
+            self.load_pool(self.persister, lazy=self.persister.lazy)
         except Exception as e:
-            messagebox.showerror("保存失败", f"自动保存失败：{str(e)}")
+            messagebox.showerror("加载失败", f"加载数据失败：{str(e)}")
+            return
 
-    def load_data(self):
+        self.update_color_combo()
+        if self.persister.lazy:
+            self.start_pool_loader()
+            return
+        self.store.build_name_index()
+        if len(self.store) > VIRTUAL_LIST_THRESHOLD:
+            self.virtual_mode.set(True)
+        self.refresh_tree()
+
+    def start_pool_loader(self):
+        # 第一片同步读入，首屏就能显示；其余的分片读入，读完之前不能抽奖
         try:
-            with open("data.json", "r", encoding="utf-8") as f:
-                save_data = json.load(f)
-                self.color_settings = save_data.get("colors", DEFAULT_COLORS)
-                self.data = save_data.get("items", [])
-                self.update_color_combo()
-                self.refresh_tree()
-        except FileNotFoundError:
-            self.color_settings = dict(DEFAULT_COLORS)
-            self.update_color_combo()
+            job = PoolLoader(self, self.persister)
+            if job.total > VIRTUAL_LIST_THRESHOLD:
+                self.virtual_mode.set(True)
+            done = job.step(time.perf_counter() + BULK_SLICE_MS / 1000)
         except Exception as e:
             messagebox.showerror("加载失败", f"加载数据失败：{str(e)}")
+            return
+        self.refresh_tree()
+        if done:
+            self.finish_bulk(job, None)
+        else:
+            self.run_bulk(job, "加载奖池")
 
     def setup_shortcut_panel(self):
         # 创建快捷面板框架
@@ -279,7 +2368,9 @@ class LotteryApp:
         music_frame.pack(pady=5, fill=tk.X)
         
         ttk.Button(music_frame, text="选择音乐", command=self.choose_music).pack(side=tk.LEFT, padx=5)
+        ttk.Button(music_frame, text="选择文件夹", command=self.choose_music_folder).pack(side=tk.LEFT, padx=5)
         ttk.Button(music_frame, text="播放/暂停", command=self.toggle_music).pack(side=tk.LEFT, padx=5)
+        ttk.Button(music_frame, text="下一首", command=self.next_track).pack(side=tk.LEFT, padx=5)
         ttk.Button(music_frame, text="停止", command=self.stop_music).pack(side=tk.LEFT, padx=5)
         self.music_label = ttk.Label(music_frame, text="未选择音乐")
         self.music_label.pack(side=tk.LEFT, padx=5)
@@ -290,41 +2381,169 @@ class LotteryApp:
         
         ttk.Button(notes_frame, text="写日记", command=lambda: self.open_notes("diary")).pack(side=tk.LEFT, padx=5)
         ttk.Button(notes_frame, text="写周报", command=lambda: self.open_notes("weekly")).pack(side=tk.LEFT, padx=5)
+        ttk.Button(notes_frame, text="搜索笔记", command=self.open_notes_search).pack(side=tk.LEFT, padx=5)
     
     def open_color_settings(self):
         ColorSettingsWindow(self.root, self)
     
     def choose_music(self):
-        file_path = filedialog.askopenfilename(
-            filetypes=[("音乐文件", "*.mp3 *.wav")]
+        file_paths = filedialog.askopenfilenames(
+            filetypes=[("音乐文件", " ".join("*" + ext for ext in MUSIC_EXTENSIONS))]
         )
-        if file_path:
-            self.current_music = file_path
-            self.music_label.config(text=os.path.basename(file_path))
-            self.stop_music()
-            pygame.mixer.music.load(file_path)
-            self.toggle_music()
+        if file_paths:
+            self.start_playlist(file_paths)
+
+    def choose_music_folder(self):
+        folder = filedialog.askdirectory()
+        if not folder:
+            return
+        try:
+            tracks = Playlist.scan(folder)
+        except OSError as e:
+            messagebox.showerror("播放失败", f"读取文件夹失败：{str(e)}")
+            return
+        if not tracks:
+            messagebox.showwarning("提示", "文件夹中没有音乐文件")
+            return
+        self.start_playlist(tracks)
+
+    def start_playlist(self, tracks):
+        self.stop_music()
+        self.playlist.set_tracks(tracks)
+        self.play_index(0)
+
+    def play_index(self, index):
+        # 文件在后台读取，读完后回到界面线程开始播放
+        self.music_token += 1
+        token = self.music_token
+        self.queued_index = None
+        self.playlist.index = index
+        self.is_playing = True
+        self.music_paused = False
+        self.music_loading = True
+        self.update_music_label("加载中...")
+        future = self.playlist.fetch(index)
+        future.add_done_callback(lambda f: self.root.after(0, self.start_track, token, index, f))
+
+    def start_track(self, token, index, future):
+        if token != self.music_token:
+            return
+        self.music_loading = False
+        try:
+            path = self.playlist.tracks[index]
+            music = self.get_mixer().music
+            source, hint = music_source(path, future.result())
+            music.load(source, hint)
+            music.play()
+        except Exception as e:
+            self.is_playing = False
+            self.update_music_label()
+            messagebox.showerror("播放失败", f"播放音乐失败：{str(e)}")
+            return
+        self.music_pos = 0
+        self.update_music_label()
+        self.prefetch_next(token)
+        if self.music_poll_job is None:
+            self.music_poll_job = self.root.after(MUSIC_POLL_MS, self.poll_music)
+
+    def prefetch_next(self, token):
+        # 当前曲目播放时预读下一首，交给 music.queue 实现无缝衔接
+        index = self.playlist.next_index()
+        if index is None:
+            return
+
+        def queue(future):
+            if token != self.music_token or self.queued_index is not None or future.exception():
+                return  # 读取失败时等到播完再正常加载并报错
+            source, hint = music_source(self.playlist.tracks[index], future.result())
+            self.get_mixer().music.queue(source, hint)
+            self.queued_index = index
+
+        self.playlist.fetch(index).add_done_callback(lambda f: self.root.after(0, queue, f))
+
+    def poll_music(self):
+        # 没有显示子系统时 pygame 不发送结束事件，所以定时检查：
+        # 排队的曲目开始播放时 get_pos 会从头计时；队列为空时播放会停下
+        self.music_poll_job = None
+        if not self.is_playing or not self.mixer_ready:
+            return
+        if self.music_loading:
+            self.music_poll_job = self.root.after(MUSIC_POLL_MS, self.poll_music)
+            return
+        music = self.get_mixer().music
+        pos = music.get_pos()
+        if self.queued_index is not None and 0 <= pos < self.music_pos:
+            self.playlist.index = self.queued_index
+            self.queued_index = None
+            self.update_music_label()
+            self.prefetch_next(self.music_token)
+        elif not music.get_busy() and not self.music_paused:
+            index = self.playlist.next_index()
+            if index is None:
+                self.is_playing = False
+                self.update_music_label()
+                return
+            self.play_index(index)
+            pos = 0
+        self.music_pos = pos
+        self.music_poll_job = self.root.after(MUSIC_POLL_MS, self.poll_music)
+
+    def next_track(self):
+        index = self.playlist.next_index()
+        if index is not None:
+            self.play_index(index)
+
+    def update_music_label(self, status=""):
+        playlist = self.playlist
+        if not playlist.tracks:
+            self.music_label.config(text="未选择音乐")
+            return
+        name = os.path.basename(playlist.tracks[playlist.index])
+        self.music_label.config(text=f"{playlist.index + 1}/{len(playlist.tracks)} {name} {status}".rstrip())
 
     def toggle_music(self):
-        if not self.current_music:
+        if not self.playlist.tracks:
             messagebox.showwarning("提示", "请先选择音乐文件")
             return
-            
-        if self.is_playing:
-            pygame.mixer.music.pause()
-            self.is_playing = False
+
+        if self.is_playing and not self.music_paused:
+            self.get_mixer().music.pause()
+            self.music_paused = True
+        elif self.music_paused:
+            self.get_mixer().music.unpause()
+            self.music_paused = False
         else:
-            pygame.mixer.music.unpause() if pygame.mixer.music.get_pos() > 0 else pygame.mixer.music.play()
-            self.is_playing = True
+            self.play_index(self.playlist.index)
 
     def stop_music(self):
-        if pygame.mixer.music.get_busy():
-            pygame.mixer.music.stop()
-            self.is_playing = False
+        self.music_token += 1
+        self.is_playing = False
+        self.music_paused = False
+        self.music_loading = False
+        self.queued_index = None
+        if self.mixer_ready:
+            self.get_mixer().music.stop()
+
+    def get_mixer(self):
+        # 第一次使用音乐功能时才导入 pygame 并初始化混音器
+        import pygame
+        if not self.mixer_ready:
+            pygame.mixer.init()
+            self.mixer_ready = True
+        return pygame.mixer
+
+    def open_notes_search(self):
+        if self.notes_index is None:
+            try:
+                self.notes_index = NotesIndex()
+            except Exception as e:
+                messagebox.showerror("搜索失败", f"打开笔记索引失败：{str(e)}")
+                return
+        NotesSearchWindow(self.root, self)
 
     def open_notes(self, note_type):
         # 创建保存笔记的目录
-        notes_dir = "notes"
+        notes_dir = NOTES_DIR
         if not os.path.exists(notes_dir):
             os.makedirs(notes_dir)
         
@@ -347,32 +2566,163 @@ class LotteryApp:
                     f.write("本周完成：\n\n")
                     f.write("下周计划：\n\n")
                     f.write("遇到的问题：\n\n")
-    
-
-        # 打开一个窗口编辑文件
-        editor_window = tk.Toplevel(self.root)
-        editor_window.title("编辑笔记")
-        editor_window.geometry("600x400")
 
-        # 创建文本框
-        text_area = tk.Text(editor_window, wrap=tk.WORD)
-        text_area.pack(expand=True, fill=tk.BOTH)
+        self.open_note_file(filename)
 
-        # 加载文件内容
-        with open(filename, "r", encoding="utf-8") as file:
-            text_area.insert(tk.END, file.read())
+    def open_note_file(self, filename):
+        # 同一个文件只开一个编辑窗口，避免两边的自动保存互相覆盖
+        filename = os.path.abspath(filename)
+        editor = self.note_editors.get(filename)
+        if editor is not None:
+            editor.lift()
+            return
+        try:
+            self.note_editors[filename] = NoteEditorWindow(self.root, self, filename)
+        except Exception as e:
+            messagebox.showerror("打开失败", f"打开笔记失败：{str(e)}")
 
-        # 创建按钮框架
-        button_frame = ttk.Frame(editor_window)
-        button_frame.pack(fill=tk.X)
+class WheelWindow(tk.Toplevel):
+    # 转盘：已勾选的奖项按颜色权重分配扇区，扇区太多时按颜色汇总。
+    # 扇区只在奖池变化时重画；转动的是指针，每帧只移动一个图形。
+    # 动画按固定帧间隔由 after 驱动，位置按时间计算，来不及时丢帧而不是变慢
+    def __init__(self, parent, app):
+        super().__init__(parent)
+        self.app = app
+        self.title("转盘")
+        self.resizable(False, False)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.canvas = tk.Canvas(self, width=WHEEL_SIZE, height=WHEEL_SIZE, highlightthickness=0)
+        self.canvas.pack(padx=10, pady=10)
+
+        self.center = WHEEL_SIZE / 2
+        self.radius = WHEEL_SIZE / 2 - 20
+        self.stamp = None
+        self.layout = {}  # 奖项 id（汇总时为颜色）→ (起始角, 角度)
+        self.groups = {}  # 颜色 → 按顺序排列的已勾选奖项
+        self.aggregated = False
+        self.pointer = None
+        self.angle = 90.0
+        self.job = None
+        self.on_done = None
+        self.rebuild_if_changed()
+
+    def rebuild_if_changed(self):
+        app = self.app
+        stamp = (app.store, app.store.version,
+                 tuple((color, config["weight"], config["color"]) for color, config in app.color_settings.items()))
+        if stamp != self.stamp:
+            self.stamp = stamp
+            with METRICS.timer("wheel.rebuild"):
+                self.build()
+
+    def build(self):
+        store = self.app.store
+        groups = [(color, config, store.members.get((color, True), []))
+                  for color, config in self.app.color_settings.items() if config["weight"] > 0]
+        groups = [(color, config, members) for color, config, members in groups if members]
+        total = sum(config["weight"] * len(members) for color, config, members in groups)
+        self.groups = {color: members for color, config, members in groups}
+        self.aggregated = sum(len(members) for members in self.groups.values()) > WHEEL_MAX_SECTORS
+        self.layout = {}
+        self.canvas.delete("all")
+        self.pointer = None
+        if total == 0:
+            self.canvas.create_text(self.center, self.center, text="没有可抽选的奖项")
+            return
 
-        # 添加按钮
-        ttk.Button(button_frame, text="保存", command=lambda: self.save_text(filename, text_area)).pack(side=tk.LEFT, padx=5)
+        start = 90.0  # 从 12 点方向开始逆时针排列
+        for color, config, members in groups:
+            if self.aggregated:
+                extent = 360.0 * config["weight"] * len(members) / total
+                self.draw_sector(start, extent, config["color"], f"{color} ×{len(members)}")
+                self.layout[color] = (start, extent)
+                start += extent
+                continue
+            extent = 360.0 * config["weight"] / total
+            for pid in members:
+                self.draw_sector(start, extent, config["color"], store.name(pid))
+                self.layout[pid] = (start, extent)
+                start += extent
+
+        c = self.center
+        self.pointer = self.canvas.create_line(c, c, *self.tip(self.angle), width=4, arrow=tk.LAST, fill="#333333")
+        self.canvas.create_oval(c - 10, c - 10, c + 10, c + 10, fill="white", outline="#333333")
+
+    def draw_sector(self, start, extent, fill, label):
+        c, r = self.center, self.radius
+        if extent >= 359.99:
+            self.canvas.create_oval(c - r, c - r, c + r, c + r, fill=fill, outline="white")
+        else:
+            self.canvas.create_arc(c - r, c - r, c + r, c + r, start=start, extent=extent,
+                                   fill=fill, outline="white", style=tk.PIESLICE)
+        if extent >= WHEEL_LABEL_MIN_EXTENT:
+            mid = math.radians(start + extent / 2)
+            self.canvas.create_text(c + r * 0.65 * math.cos(mid), c - r * 0.65 * math.sin(mid),
+                                    text=label[:8], font=("Arial", 9))
+
+    def tip(self, angle):
+        a = math.radians(angle)
+        r = self.radius - 10
+        return self.center + r * math.cos(a), self.center - r * math.sin(a)
+
+    def target(self, pid):
+        # 指针停在该奖项扇区的中间；汇总时停在颜色扇区内该奖项对应的位置
+        if not self.aggregated:
+            start, extent = self.layout[pid]
+            return start + extent / 2
+        store = self.app.store
+        color = store.color(pid)
+        start, extent = self.layout[color]
+        members = self.groups[color]
+        # 成员列表按行号排列，二分查找位置，不随奖池规模变慢
+        return start + extent * (store.member_position(members, store.rows[pid]) + 0.5) / len(members)
+
+    def spin(self, pid, on_done):
+        self.rebuild_if_changed()
+        self.finish()
+        if self.pointer is None:
+            on_done()
+            return
+        self.on_done = on_done
+        # 先转整数圈，再停到目标角度
+        self.spin_from = self.angle % 360
+        self.spin_delta = (self.target(pid) - self.spin_from) % 360 + 360 * WHEEL_TURNS
+        self.spin_start = self.deadline = time.perf_counter()
+        self.tick()
+
+    def tick(self):
+        now = time.perf_counter()
+        t = min(1.0, (now - self.spin_start) * 1000 / WHEEL_SPIN_MS)
+        with METRICS.timer("wheel.frame"):
+            self.angle = self.spin_from + self.spin_delta * (1 - (1 - t) ** 3)
+            self.canvas.coords(self.pointer, self.center, self.center, *self.tip(self.angle))
+        if t >= 1.0:
+            self.job = None
+            self.finish()
+            return
 
-    def save_text(self, filename, text_area):
-        with open(filename, "w", encoding="utf-8") as file:
-            file.write(text_area.get(1.0, tk.END))
-        messagebox.showinfo("保存成功", "文件已保存")
+        # 下一帧排在固定的帧间隔上；已经错过的帧直接丢弃
+        frame = 1.0 / WHEEL_FPS
+        self.deadline += frame
+        if now > self.deadline:
+            missed = int((now - self.deadline) / frame) + 1
+            METRICS.record("wheel.dropped", missed)
+            self.deadline += missed * frame
+        self.job = self.after(max(1, int((self.deadline - time.perf_counter()) * 1000)), self.tick)
+
+    def finish(self):
+        # 结束当前转动（被新的抽奖打断或窗口关闭时直接显示结果）
+        if self.job is not None:
+            self.after_cancel(self.job)
+            self.job = None
+        on_done, self.on_done = self.on_done, None
+        if on_done is not None:
+            on_done()
+
+    def close(self):
+        self.finish()
+        self.app.wheel = None
+        self.destroy()
 
 class ColorSettingsWindow(tk.Toplevel):
     def __init__(self, parent, app):
@@ -426,11 +2776,150 @@ class ColorSettingsWindow(tk.Toplevel):
         self.load_colors()
 
     def save_colors(self):
+        self.app.sampler.invalidate()
+        self.app.recount()
         self.app.update_color_combo()
         self.app.refresh_tree()
         self.app.auto_save()
         self.destroy()
 
+class HistoryStatsWindow(tk.Toplevel):
+    def __init__(self, parent, app):
+        super().__init__(parent)
+        self.app = app
+        self.title("抽奖统计")
+        self.geometry("400x300")
+
+        history = app.history
+        chi2, dof, p_value = history.chi_square()
+        summary = f"累计抽奖 {history.count} 次    卡方值 {chi2:.2f}（自由度 {dof}，p = {p_value:.4f}）"
+        ttk.Label(self, text=summary if history.count else "暂无抽奖记录").pack(pady=5)
+
+        tree = ttk.Treeview(self, columns=("color", "observed", "expected"), show="headings")
+        tree.heading("color", text="颜色")
+        tree.heading("observed", text="抽中次数")
+        tree.heading("expected", text="期望次数")
+        for col in ("color", "observed", "expected"):
+            tree.column(col, width=100, anchor="center")
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        for color, expected in history.expected.items():
+            tree.insert("", "end", values=(color, history.color_counts.get(color, 0), f"{expected:.1f}"))
+
+class ProbabilityCheckWindow(tk.Toplevel):
+    def __init__(self, parent, app):
+        super().__init__(parent)
+        self.app = app
+        self.title("概率校验")
+        self.geometry("520x320")
+
+        self.tree = ttk.Treeview(self, columns=("color", "nominal", "exact", "observed"), show="headings")
+        for col, text in (("color", "颜色"), ("nominal", "名义概率"), ("exact", "实际概率"), ("observed", "模拟结果")):
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=110, anchor="center")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        btn_frame = ttk.Frame(self)
+        btn_frame.pack(pady=5)
+        ttk.Label(btn_frame, text="模拟次数:").pack(side=tk.LEFT)
+        self.draws_entry = ttk.Entry(btn_frame, width=10)
+        self.draws_entry.insert(0, "1000000")
+        self.draws_entry.pack(side=tk.LEFT, padx=5)
+        self.run_button = ttk.Button(btn_frame, text="开始模拟", command=self.run)
+        self.run_button.pack(side=tk.LEFT, padx=5)
+        self.status = ttk.Label(self, text="概率为各颜色整体的中奖概率")
+        self.status.pack(pady=5)
+
+        self.show()
+
+    def show(self, result=None):
+        self.tree.delete(*self.tree.get_children())
+        shares = self.app.color_shares()
+        effective = self.app.color_shares(effective=True)
+        observed = result["colors"] if result else {}
+        for color, share in shares.items():
+            sim = observed.get(color)
+            self.tree.insert("", "end", values=(color, f"{share:.4%}", f"{effective[color]:.4%}",
+                                                f"{sim['observed']:.4%}" if sim else ""))
+
+    def run(self):
+        try:
+            draws = int(self.draws_entry.get())
+            if draws <= 0:
+                raise ValueError("模拟次数必须为正整数")
+        except ValueError as e:
+            messagebox.showerror("校验失败", f"模拟次数无效：{str(e)}")
+            return
+
+        # 多进程模拟在后台线程等待，结果通过 after 交回界面线程
+        groups = self.app.sampling_groups()
+        self.run_button.config(state=tk.DISABLED)
+        self.status.config(text="模拟中…")
+
+        def worker():
+            try:
+                result = verify_probabilities(groups, draws)
+            except Exception as e:
+                self.after(0, lambda e=e: self.finish(error=e))
+                return
+            self.after(0, lambda: self.finish(result))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def finish(self, result=None, error=None):
+        if not self.winfo_exists():
+            return
+        self.run_button.config(state=tk.NORMAL)
+        if error is not None:
+            self.status.config(text="")
+            messagebox.showerror("校验失败", f"蒙特卡洛模拟失败：{str(error)}")
+            return
+        self.show(result)
+        self.status.config(text=f"{result['draws']} 次 / {result['workers']} 个进程    卡方值 {result['chi_square']:.2f}"
+                                f"（自由度 {result['dof']}，p = {result['p_value']:.4f}）")
+
+class DiagnosticsWindow(tk.Toplevel):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("诊断")
+        self.geometry("620x360")
+
+        self.tree = ttk.Treeview(self, columns=("name", "count", "p50", "p90", "p99", "max"), show="headings")
+        for col, text in (("name", "项目"), ("count", "样本数"), ("p50", "p50"),
+                          ("p90", "p90"), ("p99", "p99"), ("max", "最大")):
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=180 if col == "name" else 80, anchor="center")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        btn_frame = ttk.Frame(self)
+        btn_frame.pack(pady=5)
+        ttk.Label(btn_frame, text="耗时单位为毫秒，bytes 项为字节数").pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="导出JSON", command=self.export).pack(side=tk.LEFT, padx=5)
+
+        self.job = None
+        self.refresh()
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        if not METRICS.enabled:
+            self.tree.insert("", "end", values=("未启用统计（诊断 → 启用统计）", "", "", "", "", ""))
+        for name, stats in sorted(METRICS.summary().items()):
+            self.tree.insert("", "end", values=(name, stats["count"]) + tuple(
+                f"{stats[key]:.2f}" for key in ("p50", "p90", "p99", "max")))
+        self.job = self.after(1000, self.refresh)
+
+    def destroy(self):
+        # 先取消下一次刷新，否则窗口销毁后定时器仍会触发（关闭主窗口时也经过这里）
+        if self.job is not None:
+            self.after_cancel(self.job)
+            self.job = None
+        super().destroy()
+
+    def export(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if path:
+            METRICS.export(path)
+
 class AddColorWindow(tk.Toplevel):
     def __init__(self, parent, app):
         super().__init__(parent)
@@ -492,13 +2981,269 @@ class AddColorWindow(tk.Toplevel):
         self.destroy()
         self.master.load_colors()
 
-def check_for_updates():
+class DownloadProgressWindow(tk.Toplevel):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("下载更新")
+        self.geometry("320x100")
+        # 下载完成或失败时自动关闭
+        self.protocol("WM_DELETE_WINDOW", lambda: None)
+
+        self.label = ttk.Label(self, text="正在下载...")
+        self.label.pack(pady=10)
+        self.progress = ttk.Progressbar(self, length=280, mode="determinate")
+        self.progress.pack(padx=10)
+
+    def set_progress(self, done, total):
+        if total:
+            self.progress["maximum"] = total
+            self.progress["value"] = done
+            self.label.config(text=f"正在下载... {done // 1024} / {total // 1024} KB")
+        else:
+            self.label.config(text=f"正在下载... {done // 1024} KB")
+
+class BulkProgressWindow(tk.Toplevel):
+    def __init__(self, parent, title):
+        super().__init__(parent)
+        self.title(title)
+        self.geometry("320x100")
+        self.protocol("WM_DELETE_WINDOW", lambda: None)
+
+        self.label = ttk.Label(self, text=f"正在{title}...")
+        self.label.pack(pady=10)
+        self.progress = ttk.Progressbar(self, length=280, mode="determinate", maximum=100)
+        self.progress.pack(padx=10)
+
+    def set_progress(self, fraction):
+        self.progress["value"] = fraction * 100
+
+def write_file_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class NoteEditorWindow(tk.Toplevel):
+    # 笔记编辑器：大文件分块插入，不阻塞界面；停止输入一段时间后在后台线程原子写入，内容没变则不写
+    def __init__(self, parent, app, filename):
+        self.file = open(filename, "r", encoding="utf-8")
+        super().__init__(parent)
+        self.app = app
+        self.filename = filename
+        self.size = os.path.getsize(filename)
+        self.title(f"编辑笔记 - {os.path.basename(filename)}")
+        self.geometry("600x400")
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.text_area = tk.Text(self, wrap=tk.WORD, undo=True)
+        self.text_area.pack(expand=True, fill=tk.BOTH)
+        self.text_area.bind("<<Modified>>", self.on_modified)
+
+        button_frame = ttk.Frame(self)
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="保存", command=self.save_now).pack(side=tk.LEFT, padx=5)
+        self.status = ttk.Label(button_frame, text="加载中...")
+        self.status.pack(side=tk.LEFT, padx=5)
+
+        self.loading = True
+        self.load_job = None
+        self.save_job = None
+        self.loaded_hash = hashlib.sha1()
+        self.saved_hash = None  # 只在写入线程里读写
+        # 单线程执行器保证多次保存按提交顺序写盘
+        self.writer = concurrent.futures.ThreadPoolExecutor(1)
+        self.text_area.config(state=tk.DISABLED)
+        self.load_chunk()
+
+    def load_chunk(self):
+        chunk = self.file.read(NOTE_LOAD_CHUNK)
+        if chunk:
+            self.loaded_hash.update(chunk.encode("utf-8"))
+            self.text_area.config(state=tk.NORMAL)
+            self.text_area.insert("end-1c", chunk)
+            self.text_area.config(state=tk.DISABLED)
+            self.status.config(text=f"加载中... {self.file.buffer.tell() * 100 // max(self.size, 1)}%")
+            self.load_job = self.after(1, self.load_chunk)
+            return
+
+        self.file.close()
+        self.load_job = None
+        self.saved_hash = self.loaded_hash.hexdigest()
+        self.text_area.config(state=tk.NORMAL)
+        self.text_area.edit_reset()
+        self.text_area.edit_modified(False)
+        self.loading = False
+        self.status.config(text="已加载")
+
+    def on_modified(self, event=None):
+        if self.loading or not self.text_area.edit_modified():
+            return
+        # 复位修改标记，下一次修改才会再次触发；保存推迟到停止输入之后
+        self.text_area.edit_modified(False)
+        self.status.config(text="未保存")
+        if self.save_job is not None:
+            self.after_cancel(self.save_job)
+        self.save_job = self.after(NOTE_SAVE_DELAY_MS, self.save_now)
+
+    def save_now(self):
+        if self.loading:
+            return
+        if self.save_job is not None:
+            self.after_cancel(self.save_job)
+            self.save_job = None
+        self.status.config(text="保存中...")
+        self.writer.submit(self.write, self.text_area.get("1.0", "end-1c"))
+
+    def write(self, content):
+        # 写入线程。读入时换行已统一为 \n，哈希按读入的内容计算；
+        # 写盘时与原来的文本模式一样换成系统换行符，Windows 上保持 CRLF
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        try:
+            if digest != self.saved_hash:
+                write_file_atomic(self.filename, content.replace("\n", os.linesep).encode("utf-8"))
+                self.saved_hash = digest
+        except Exception as e:
+            self.post_status(f"保存失败：{str(e)}")
+            return
+        self.post_status(f"已保存 {datetime.now().strftime('%H:%M:%S')}")
+
+    def post_status(self, text):
+        try:
+            self.after(0, lambda: self.status.winfo_exists() and self.status.config(text=text))
+        except (RuntimeError, tk.TclError):
+            pass  # 窗口已关闭
+
+    def close(self):
+        if self.loading:
+            if self.load_job is not None:
+                self.after_cancel(self.load_job)
+            self.file.close()
+        else:
+            self.save_now()  # 内容没变时不会写盘
+        # 已提交的保存仍会执行完
+        self.writer.shutdown(wait=False)
+        self.app.note_editors.pop(self.filename, None)
+        self.destroy()
+
+class NotesSearchWindow(tk.Toplevel):
+    def __init__(self, parent, app):
+        super().__init__(parent)
+        self.app = app
+        self.index = app.notes_index
+        self.query_id = 0
+        self.title("搜索笔记")
+        self.geometry("640x400")
+
+        search_frame = ttk.Frame(self)
+        search_frame.pack(pady=5, fill=tk.X)
+        self.entry = ttk.Entry(search_frame)
+        self.entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        self.entry.bind("<Return>", lambda e: self.search())
+        ttk.Button(search_frame, text="搜索", command=self.search).pack(side=tk.LEFT, padx=5)
+
+        self.tree = ttk.Treeview(self, columns=("name", "snippet"), show="headings")
+        self.tree.heading("name", text="笔记")
+        self.tree.heading("snippet", text="摘要")
+        self.tree.column("name", width=150)
+        self.tree.column("snippet", width=450)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.tree.bind("<Double-1>", self.open_selected)
+
+        self.status = ttk.Label(self, text="正在更新索引...")
+        self.status.pack(pady=5)
+        self.entry.focus_set()
+        self.run(None)
+
+    def search(self):
+        self.run(self.entry.get().strip())
+
+    def run(self, query):
+        # 索引更新和查询都在后台线程执行；较早的查询结果到达时直接丢弃
+        self.query_id += 1
+        query_id = self.query_id
+
+        def worker():
+            try:
+                start = time.perf_counter()
+                self.index.update()
+                results = self.index.search(query) if query else None
+                elapsed = time.perf_counter() - start
+                total = len(self.index)
+            except Exception as e:
+                self.after(0, lambda e=e: messagebox.showerror("搜索失败", f"搜索笔记失败：{str(e)}"))
+                return
+            self.after(0, lambda: self.show(query_id, results, total, elapsed))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show(self, query_id, results, total, elapsed):
+        if query_id != self.query_id or not self.winfo_exists():
+            return
+        if results is None:
+            self.status.config(text=f"已索引 {total} 篇笔记")
+            return
+        self.tree.delete(*self.tree.get_children())
+        for name, score, snippet in results:
+            self.tree.insert("", "end", iid=name, values=(name, snippet))
+        self.status.config(text=f"找到 {len(results)} 篇（共 {total} 篇，{elapsed * 1000:.0f} ms）")
+
+    def open_selected(self, event):
+        selected = self.tree.selection()
+        if selected:
+            self.app.open_note_file(os.path.join(NOTES_DIR, selected[0]))
+
+def fetch_version_info(url=VERSION_URL, cache_path=UPDATE_CACHE_PATH, timeout=UPDATE_TIMEOUT):
+    # 获取最新版本信息。带上缓存的 ETag/Last-Modified 发送条件请求，服务器返回 304 时直接使用缓存
+    import requests
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        cache = {}
+    if cache.get("url") != url:
+        cache = {}
+
+    headers = {}
+    if cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    if cache.get("last_modified"):
+        headers["If-Modified-Since"] = cache["last_modified"]
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and "version_info" in cache:
+        return cache["version_info"]
+    response.raise_for_status()
+    version_info = response.json()
+
+    cache = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "version_info": version_info
+    }
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+    return version_info
+
+def check_for_updates(root, silent=False):
+    # 在后台线程请求版本信息，结果通过 root.after 交回界面线程；silent 时只在有新版本时提示
+    def worker():
+        try:
+            version_info = fetch_version_info()
+        except Exception as e:
+            if not silent:
+                root.after(0, lambda e=e: messagebox.showerror("更新检查失败", f"检查更新失败：{str(e)}"))
+            return
+        root.after(0, lambda: handle_version_info(root, version_info, silent))
+
+    threading.Thread(target=worker, daemon=True).start()
+
+def handle_version_info(root, version_info, silent=False):
     try:
-        # 从服务器获取最新版本信息
-        version_url = "https://raw.githubusercontent.com/Voller-u/Spinner/master/version.json"
-        response = requests.get(version_url)
-        version_info = response.json()
-        
         latest_version = version_info["version"]
         download_url = version_info["download_url"]
         
@@ -509,7 +3254,7 @@ def check_for_updates():
         except FileNotFoundError:
             if messagebox.askyesno("更新可用", 
                 f"发现新版本 {latest_version}\n当前版本未知\n是否更新？"):
-                download_and_replace(download_url, version_info)
+                download_and_replace(root, download_url, version_info)
             return
             
         CURRENT_VERSION = current_version_info["version"]
@@ -527,60 +3272,368 @@ def check_for_updates():
         if needs_update:
             if messagebox.askyesno("更新可用", 
                 f"发现新版本 {latest_version}\n当前版本 {CURRENT_VERSION}\n是否更新？"):
-                download_and_replace(download_url, version_info)
-        else:
+                download_and_replace(root, download_url, version_info)
+        elif not silent:
             messagebox.showinfo("检查更新", "当前已是最新版本！")
             
     except Exception as e:
-        messagebox.showerror("更新检查失败", f"检查更新失败：{str(e)}")
+        if not silent:
+            messagebox.showerror("更新检查失败", f"检查更新失败：{str(e)}")
+
+def download_update(download_url, version_info, target, progress=None, chunk_size=64 * 1024):
+    # 分块下载到 .part 文件，已有部分时用 Range 续传；version.json 提供 sha256 时校验后再原子替换 target
+    import requests
+    part_path = f"{target}.{version_info['version']}.part"
+    digest = hashlib.sha256()
+    done = 0
+    headers = {}
+    if os.path.exists(part_path):
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+                done += len(chunk)
+        headers["Range"] = f"bytes={done}-"
+
+    with requests.get(download_url, headers=headers, stream=True, timeout=UPDATE_TIMEOUT) as response:
+        # 416 表示已下载的部分就是完整文件
+        if response.status_code != 416:
+            response.raise_for_status()
+            if response.status_code != 206:
+                # 服务器不支持续传，从头下载
+                digest = hashlib.sha256()
+                done = 0
+            length = response.headers.get("Content-Length")
+            total = done + int(length) if length else 0
+            with open(part_path, "ab" if done else "wb") as f:
+                for chunk in response.iter_content(chunk_size):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    done += len(chunk)
+                    if progress:
+                        progress(done, total)
+                f.flush()
+                os.fsync(f.fileno())
+
+    expected = version_info.get("sha256")
+    if expected and digest.hexdigest() != expected.lower():
+        os.remove(part_path)
+        raise ValueError("下载的文件校验失败")
+    os.replace(part_path, target)
+
+def download_and_replace(root, download_url, version_info):
+    # 在后台线程下载，进度和结果通过 root.after 交回界面线程
+    window = DownloadProgressWindow(root)
+    last_report = [0.0]
+
+    def progress(done, total):
+        now = time.monotonic()
+        if now - last_report[0] >= 0.1 or done == total:
+            last_report[0] = now
+            root.after(0, window.set_progress, done, total)
+
+    def worker():
+        try:
+            download_update(download_url, version_info, os.path.abspath(__file__), progress)
+        except Exception as e:
+            root.after(0, lambda e=e: finish_update(window, version_info, e))
+            return
+        root.after(0, lambda: finish_update(window, version_info))
+
+    threading.Thread(target=worker, daemon=True).start()
 
-def download_and_replace(download_url, version_info):
+def finish_update(window, version_info, error=None):
+    window.destroy()
     try:
-        response = requests.get(download_url)
-        response.raise_for_status()
-        
-        # 获取当前脚本路径
-        current_script = os.path.abspath(__file__)
-        
-        # 创建备份
-        backup_path = current_script + ".backup"
-        os.replace(current_script, backup_path)
+        if error is not None:
+            raise error
+
+        # 更新version.json文件
+        with open("version.json", "w", encoding="utf-8") as f:
+            json.dump(version_info, f, ensure_ascii=False, indent=2)
         
-        # 保存新文件
-        try:
-            with open(current_script, 'wb') as f:
-                f.write(response.content)
-            
-            latest_version = version_info["version"]
-            # 更新version.json文件
-            # version_info = {"version": latest_version}
-            with open("version.json", "w", encoding="utf-8") as f:
-                json.dump(version_info, f, ensure_ascii=False, indent=2)
-            
-            # 更新成功后删除备份
-            os.remove(backup_path)
-            
-            if messagebox.askyesno("更新完成", "程序已更新，需要重启才能生效。是否立即重启？"):
-                python = sys.executable
-                os.execl(python, python, *sys.argv)
-                
-        except Exception as e:
-            # 如果保存新文件失败，恢复备份
-            if os.path.exists(backup_path):
-                os.replace(backup_path, current_script)
-            raise e
+        if messagebox.askyesno("更新完成", "程序已更新，需要重启才能生效。是否立即重启？"):
+            python = sys.executable
+            os.execl(python, python, *sys.argv)
             
     except Exception as e:
         messagebox.showerror("更新失败", f"更新失败：{str(e)}")
 
-def __del__(self):
+def make_draw_server(address, engine, workers=4):
+    # http.server 导入较慢，只在启动服务时导入
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class DrawRequestHandler(BaseHTTPRequestHandler):
+        # GET /draw?n=&seed=  /list?color=&sort=&order=&offset=&limit=&q=  /stats
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {name: values[0] for name, values in parse_qs(url.query).items()}
+            engine = self.server.engine
+            try:
+                if url.path == "/draw":
+                    n = int(query.get("n", 1))
+                    seed = int(query["seed"]) if "seed" in query else None
+                    # 抽样器记着上一次结果，需要串行访问才能保证不重复规则
+                    with self.server.lock:
+                        if n == 1 and seed is None:
+                            selected = engine.draw()
+                            results = [] if selected is None else [selected]
+                        else:
+                            results = engine.draw_many(n, seed=seed)
+                    body = {"results": [engine.describe(pid) for pid in results]}
+                elif url.path == "/list":
+                    limit = int(query["limit"]) if "limit" in query else None
+                    if query.get("sort", "默认") not in ("默认", "颜色", "权重", "概率"):
+                        raise ValueError(f"未知排序：{query['sort']}")
+                    if query.get("order", "升序") not in ("升序", "降序"):
+                        raise ValueError(f"未知顺序：{query['order']}")
+                    # 排序结果缓存在 engine 里，同样要串行访问
+                    with self.server.lock:
+                        body = {"items": engine.list_rows(query.get("color", "全部"), query.get("sort", "默认"),
+                                                          query.get("order") == "降序", int(query.get("offset", 0)),
+                                                          limit, query.get("q", ""))}
+                elif url.path == "/stats":
+                    body = engine.pool_stats()
+                else:
+                    self.send_json(404, {"error": "not found"})
+                    return
+            except (ValueError, KeyError) as e:
+                self.send_json(400, {"error": str(e)})
+                return
+            self.send_json(200, body)
+
+        def send_json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    class DrawServer(HTTPServer):
+        # 请求交给固定大小的线程池处理
+        def __init__(self, address, engine, workers=4):
+            super().__init__(address, DrawRequestHandler)
+            self.engine = engine
+            self.lock = threading.Lock()
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+        def process_request(self, request, client_address):
+            self.executor.submit(self.process_request_worker, request, client_address)
+
+        def process_request_worker(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+        def server_close(self):
+            super().server_close()
+            self.executor.shutdown()
+
+    return DrawServer(address, engine, workers)
+
+def run_cli(args):
+    # 无界面模式：读取与界面相同的奖池文件
+    if args.command == "search":
+        # 只搜索笔记，不读奖池
+        index = NotesIndex()
+        try:
+            index.update()
+            results = index.search(args.query, args.limit)
+        finally:
+            index.close()
+        if args.json:
+            print(json.dumps([{"name": name, "score": score, "snippet": snippet}
+                              for name, score, snippet in results], ensure_ascii=False))
+        else:
+            for name, score, snippet in results:
+                print(f"{score:6.2f}  {name}  {snippet}")
+        return 0
+
+    if args.pool != DEFAULT_POOL and not valid_pool_name(args.pool):
+        print(f"奖池名称无效：{args.pool}", file=sys.stderr)
+        return 2
+    # 只读的命令不创建奖池目录和抽奖记录文件，也不改写统计缓存
+    readonly = args.command in ("list", "stats", "export")
+    if args.pool not in list_pools():
+        print(f"奖池不存在：{args.pool}", file=sys.stderr)
+        return 2
+    engine = LotteryEngine()
+    persister, history = open_pool_files(args.pool, readonly=readonly)
     try:
-        pygame.mixer.quit()
-    except:
-        pass
+        # SQLite 存储的 list 直接分页查询，不读入奖池
+        paged = args.command == "list" and persister.lazy
+        if paged:
+            engine.load_counts(persister)
+        else:
+            engine.sampler.version = history.last_version
+            engine.load_pool(persister)
+            # 接着上一次的结果，保持"与上一次不同"的规则
+            last = history.last_draw()
+            if last in engine.store:
+                engine.sampler.last = last
+        if getattr(args, "record", False):
+            engine.history = history
+        engine.effective = getattr(args, "effective", False)
+
+        if args.command == "draw":
+            results = engine.draw_many(args.n, seed=args.seed)
+            if not results:
+                print("没有可抽选的奖项", file=sys.stderr)
+                return 1
+            history.remember_last(results[-1])
+            if args.json:
+                print(json.dumps([engine.describe(pid) for pid in results], ensure_ascii=False))
+            else:
+                for pid in results:
+                    print(f"{engine.store.name(pid)} ({engine.store.color(pid)})")
+        elif args.command == "list":
+            if args.color != "全部" and args.color not in engine.color_settings:
+                print(f"未知颜色：{args.color}", file=sys.stderr)
+                return 2
+            if paged:
+                rows = engine.page_rows(persister, args.color, args.sort, args.desc, query=args.search)
+            else:
+                rows = engine.list_rows(args.color, args.sort, args.desc, query=args.search)
+            if args.json:
+                print(json.dumps(rows, ensure_ascii=False))
+            else:
+                for row in rows:
+                    print(f"{row['id']:>8}  {'✓' if row['checked'] else ' '}  {row['name']}  "
+                          f"{row['color']}  {row['weight']}  {row['probability']:.2%}")
+        elif args.command == "stats":
+            stats = engine.pool_stats()
+            chi2, dof, p_value = history.chi_square()
+            stats["history"] = {"draws": history.count}
+            if history.count:
+                stats["history"].update(chi_square=chi2, dof=dof, p_value=p_value)
+            if args.json:
+                print(json.dumps(stats, ensure_ascii=False))
+            else:
+                print(f"奖项 {stats['prizes']} 个，已勾选 {stats['checked']} 个")
+                for color, info in stats["colors"].items():
+                    print(f"  {color}  权重 {info['weight']}  勾选 {info['checked']}/{info['prizes']}  "
+                          f"单个奖项 {info['probability']:.2%}  合计 {info['share']:.2%}  "
+                          f"实际合计 {info['effective_share']:.2%}")
+                if history.count:
+                    print(f"累计抽奖 {history.count} 次，卡方值 {chi2:.2f}（自由度 {dof}，p = {p_value:.4f}）")
+                else:
+                    print("暂无抽奖记录")
+        elif args.command == "verify":
+            result = engine.verify_probabilities(args.draws, args.workers, args.seed)
+            if args.json:
+                print(json.dumps(result, ensure_ascii=False))
+            else:
+                print(f"模拟 {result['draws']} 次（{result['workers']} 个进程）")
+                for color, info in result["colors"].items():
+                    print(f"  {color}  实际概率 {info['exact']:.4%}  模拟结果 {info['observed']:.4%}")
+                print(f"卡方值 {result['chi_square']:.2f}（自由度 {result['dof']}，p = {result['p_value']:.4f}）")
+        elif args.command == "import":
+            # 出错时不保存，奖池保持导入前的状态
+            try:
+                job = PrizeImporter(engine, args.path, args.merge)
+                try:
+                    job.step(math.inf)
+                finally:
+                    job.close()
+            except Exception as e:
+                print(f"导入失败：{str(e)}", file=sys.stderr)
+                return 1
+            engine.sampler.invalidate()
+            engine.recount()
+            persister.write(engine.snapshot())
+            print(job.summary())
+        elif args.command == "export":
+            try:
+                job = PrizeExporter(engine, args.path)
+                try:
+                    job.step(math.inf)
+                except Exception:
+                    job.close()
+                    raise
+            except Exception as e:
+                print(f"导出失败：{str(e)}", file=sys.stderr)
+                return 1
+            print(job.summary())
+        elif args.command == "serve":
+            engine.store.build_name_index()
+            server = make_draw_server((args.host, args.port), engine, args.workers)
+            print(f"抽奖服务已启动：http://{args.host}:{server.server_port}/draw")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+                if engine.sampler.last is not None:
+                    history.remember_last(engine.sampler.last)
+        return 0
+    finally:
+        persister.close()
+        history.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="任务决策助手")
+    parser.add_argument("--profile-startup", action="store_true", help="输出启动各阶段的耗时")
+    parser.add_argument("--diagnostics", action="store_true", help="启动时即开启诊断统计")
+    parser.add_argument("--pool", default=DEFAULT_POOL, help="命令行模式下使用的奖池")
+    parser.add_argument("--storage", choices=["json", "sqlite"], default=STORAGE_BACKEND,
+                        help="奖池存储方式，sqlite 首次使用时从 data.json 迁移")
+    subparsers = parser.add_subparsers(dest="command", help="不打开窗口，直接在命令行执行")
+
+    draw_parser = subparsers.add_parser("draw", help="抽奖，可一次抽多次")
+    draw_parser.add_argument("n", type=int, nargs="?", default=1)
+    draw_parser.add_argument("--seed", type=int)
+    draw_parser.add_argument("--record", action="store_true", help="写入抽奖记录（界面未运行时使用）")
+    draw_parser.add_argument("--json", action="store_true")
+
+    list_parser = subparsers.add_parser("list", help="列出奖池")
+    list_parser.add_argument("--color", default="全部")
+    list_parser.add_argument("--sort", default="默认", choices=["默认", "颜色", "权重", "概率"])
+    list_parser.add_argument("--desc", action="store_true")
+    list_parser.add_argument("--search", default="", help="只列出名称包含该文字的奖项")
+    list_parser.add_argument("--effective", action="store_true", help="显示不重复规则下的实际概率")
+    list_parser.add_argument("--json", action="store_true")
+
+    stats_parser = subparsers.add_parser("stats", help="奖池与抽奖记录统计")
+    stats_parser.add_argument("--json", action="store_true")
+
+    verify_parser = subparsers.add_parser("verify", help="多进程蒙特卡洛校验实际概率")
+    verify_parser.add_argument("--draws", type=int, default=1000000)
+    verify_parser.add_argument("--workers", type=int)
+    verify_parser.add_argument("--seed", type=int)
+    verify_parser.add_argument("--json", action="store_true")
+
+    import_parser = subparsers.add_parser("import", help="从 CSV/JSONL/JSON 批量导入奖项")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--merge", action="store_true", help="重名时用导入的颜色和勾选状态覆盖，默认跳过")
+
+    export_parser = subparsers.add_parser("export", help="导出奖池为 CSV/JSONL/JSON")
+    export_parser.add_argument("path")
+
+    search_parser = subparsers.add_parser("search", help="全文搜索笔记")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=20)
+    search_parser.add_argument("--json", action="store_true")
+
+    serve_parser = subparsers.add_parser("serve", help="启动本地 JSON 抽奖服务")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--workers", type=int, default=4)
+    serve_parser.add_argument("--record", action="store_true", help="写入抽奖记录（界面未运行时使用）")
+
+    args = parser.parse_args()
+    STORAGE_BACKEND = args.storage
+    METRICS.enabled = args.diagnostics
+    if args.command:
+        sys.exit(run_cli(args))
+
     root = tk.Tk()
-    app = LotteryApp(root)
+    app = LotteryApp(root, profile_startup=args.profile_startup)
     root.geometry("1000x700")
     root.mainloop()
\ No newline at end of file